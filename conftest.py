@@ -0,0 +1,10 @@
+import pytest
+
+from core.testing import temporary_cache
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_cache_file(django_test_environment):
+    """Тесты pytest получают временный файл кэша, как и manage.py test."""
+    with temporary_cache():
+        yield
@@ -37,3 +37,16 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    settings.QUERY_BUDGET_ENFORCE = True
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,356 @@
+"""Двухуровневый кэш: LRU в памяти процесса поверх общего файла SQLite.
+
+Второй уровень — файл SQLite, общий для всех процессов на машине, поэтому
+отдельный сервис не нужен. Первый уровень — LRUCache с уже
+сериализованными значениями: попадание в него не обращается к файлу.
+
+Каждая запись в файл получает очередной номер (штамп) из общего счётчика,
+удаление оставляет запись без значения с новым штампом. Перед чтением
+процесс сверяет PRAGMA data_version своего соединения: если другие
+соединения что-то записали, из первого уровня убираются ключи, изменённые
+после последнего увиденного штампа. Так все процессы одинаково решают,
+какое значение свежее, и не опрашивают файл при каждом попадании.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .lru import LRUCache
+
+LOCAL_MAX_ENTRIES = 10_000
+# Количество записей в файле проверяется раз в столько штампов.
+CULL_CHECK_EVERY = 100
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_VARIABLES = 900
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    'key TEXT PRIMARY KEY, value BLOB, expires REAL, '
+    'stamp INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_entry_stamp ON cache_entry (stamp)',
+    # stamp — последний выданный штамп; horizon — штамп, до которого
+    # записи удалялись целиком, без следа для других процессов.
+    'CREATE TABLE IF NOT EXISTS cache_meta ('
+    'id INTEGER PRIMARY KEY CHECK (id = 1), stamp INTEGER NOT NULL, '
+    'horizon INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_meta VALUES (1, 0, 0)',
+)
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class _Local:
+    """Первый уровень, общий для всех потоков процесса."""
+
+    def __init__(self, size):
+        self.entries = LRUCache(size)
+        self.lock = threading.Lock()
+        # Последний штамп, изменения до которого уже учтены; None, пока
+        # процесс ни разу не сверялся с файлом.
+        self.stamp = None
+        # Штампы собственных записей: их ключи выселять не нужно.
+        self.own = set()
+
+
+@contextmanager
+def transaction(connection, mode='IMMEDIATE'):
+    connection.execute(f'BEGIN {mode}')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _chunks(items, size=MAX_VARIABLES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class TwoTierCache(BaseCache):
+    """Бэкенд кэша Django. LOCATION — путь к файлу второго уровня,
+    OPTIONS['LOCAL_MAX_ENTRIES'] — размер первого уровня.
+    MAX_ENTRIES и CULL_FREQUENCY ограничивают файл, как у DatabaseCache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        with _shared_lock:
+            self.local = _shared.setdefault(location, _Local(
+                options.get('LOCAL_MAX_ENTRIES', LOCAL_MAX_ENTRIES)
+            ))
+        self._connection = None
+        self._pid = None
+        self._data_version = None
+
+    def connection(self):
+        # После fork соединение родителя использовать нельзя.
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            with transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._connection, self._pid = connection, os.getpid()
+            self._data_version = None
+        return self._connection
+
+    def sync(self):
+        """Выселяет из первого уровня ключи, которые изменили другие
+        соединения; без чужих записей стоит одной PRAGMA.
+        """
+        connection = self.connection()
+        version = connection.execute('PRAGMA data_version').fetchone()[0]
+        local = self.local
+        if version == self._data_version and local.stamp is not None:
+            return connection
+        self._data_version = version
+        with local.lock, transaction(connection, 'DEFERRED'):
+            stamp, horizon = connection.execute(
+                'SELECT stamp, horizon FROM cache_meta'
+            ).fetchone()
+            if local.stamp is None or horizon > local.stamp:
+                local.entries.clear()
+            elif stamp > local.stamp:
+                for key, changed in connection.execute(
+                    'SELECT key, stamp FROM cache_entry WHERE stamp > ?',
+                    (local.stamp,)
+                ):
+                    if changed not in local.own:
+                        local.entries.delete(key)
+            local.stamp = stamp
+            local.own = {own for own in local.own if own > stamp}
+        return connection
+
+    def _fill(self, seen, entries):
+        """Кладёт прочитанное или записанное в первый уровень, если
+        с момента обращения к файлу процесс не сверялся с ним: иначе
+        значение могло уже устареть, и ключи просто выселяются.
+        """
+        local = self.local
+        with local.lock:
+            for key, entry in entries.items():
+                if entry is None or local.stamp != seen:
+                    local.entries.delete(key)
+                else:
+                    local.entries.set(key, entry)
+
+    def _read(self, keys):
+        connection = self.sync()
+        now = time.time()
+        found, missing = {}, []
+        for key in keys:
+            entry = self.local.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                found[key] = entry[1]
+            else:
+                missing.append(key)
+        seen = self.local.stamp
+        loaded = {}
+        for chunk in _chunks(missing):
+            loaded.update(
+                (key, (expires, value))
+                for key, value, expires in connection.execute(
+                    'SELECT key, value, expires FROM cache_entry '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))}) '
+                    'AND value IS NOT NULL '
+                    'AND (expires IS NULL OR expires > ?)',
+                    (*chunk, now)
+                )
+            )
+        if loaded:
+            self._fill(seen, loaded)
+            found.update((key, value) for key, (_, value) in loaded.items())
+        return {key: self._decode(value) for key, value in found.items()}
+
+    def _write(self, rows, only_missing=False):
+        """Записывает (ключ, значение, срок) под одним новым штампом;
+        значение None удаляет ключ. Возвращает число изменённых ключей.
+        """
+        connection = self.sync()
+        seen = self.local.stamp
+        now = time.time()
+        written = {}
+        with transaction(connection):
+            stamp = self._next_stamp(connection)
+            for key, value, expires in rows:
+                if only_missing:
+                    cursor = connection.execute(
+                        'INSERT INTO cache_entry VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (key) DO UPDATE SET '
+                        'value = excluded.value, '
+                        'expires = excluded.expires, '
+                        'stamp = excluded.stamp '
+                        'WHERE cache_entry.value IS NULL '
+                        'OR cache_entry.expires <= ?',
+                        (key, value, expires, stamp, now)
+                    )
+                else:
+                    cursor = connection.execute(
+                        'INSERT OR REPLACE INTO cache_entry '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, value, expires, stamp)
+                    )
+                if cursor.rowcount:
+                    written[key] = (None if value is None
+                                    else (expires, value))
+            if stamp % CULL_CHECK_EVERY == 0 and self._cull(connection, now):
+                # Пусть следующая сверка учтёт новый horizon.
+                self._data_version = None
+        with self.local.lock:
+            self.local.own.add(stamp)
+        self._fill(seen, written)
+        return len(written)
+
+    def _next_stamp(self, connection):
+        connection.execute('UPDATE cache_meta SET stamp = stamp + 1')
+        stamp, = connection.execute('SELECT stamp FROM cache_meta').fetchone()
+        return stamp
+
+    def _cull(self, connection, now):
+        count, = connection.execute(
+            'SELECT count(*) FROM cache_entry'
+        ).fetchone()
+        if count <= self._max_entries:
+            return False
+        # Сначала удаляются просроченные и удалённые записи, затем
+        # самые давно записанные. Процессы, не видевшие удалённых
+        # штампов, очистят первый уровень целиком.
+        deleted = connection.execute(
+            'SELECT max(stamp), count(*) FROM cache_entry '
+            'WHERE value IS NULL OR expires <= ?', (now,)
+        ).fetchone()
+        horizon = deleted[0] or 0
+        connection.execute(
+            'DELETE FROM cache_entry WHERE value IS NULL OR expires <= ?',
+            (now,)
+        )
+        count -= deleted[1]
+        if count > self._max_entries and self._cull_frequency:
+            limit = count // self._cull_frequency
+            oldest, = connection.execute(
+                'SELECT max(stamp) FROM (SELECT stamp FROM cache_entry '
+                'ORDER BY stamp LIMIT ?)', (limit,)
+            ).fetchone()
+            connection.execute(
+                'DELETE FROM cache_entry WHERE stamp <= ?', (oldest,)
+            )
+            horizon = max(horizon, oldest or 0)
+        connection.execute(
+            'UPDATE cache_meta SET horizon = max(horizon, ?)', (horizon,)
+        )
+        return True
+
+    def _encode(self, value):
+        # Целые хранятся числом, чтобы incr менял их одним UPDATE.
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._write(
+            [(key, self._encode(value), self.get_backend_timeout(timeout))],
+            only_missing=True
+        ))
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        return {made[key]: value
+                for key, value in self._read(list(made)).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if data:
+            expires = self.get_backend_timeout(timeout)
+            self._write([
+                (self._key(key, version), self._encode(value), expires)
+                for key, value in data.items()
+            ])
+        return []
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно, в одной транзакции файла: одновременные incr
+        из разных процессов не теряют друг друга.
+        """
+        key = self._key(key, version)
+        connection = self.sync()
+        seen = self.local.stamp
+        now = time.time()
+        with transaction(connection):
+            stamp = self._next_stamp(connection)
+            connection.execute(
+                'UPDATE cache_entry SET value = value + ?, stamp = ? '
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, stamp, key, now)
+            )
+            row = connection.execute(
+                'SELECT value, expires FROM cache_entry WHERE key = ? '
+                'AND value IS NOT NULL AND (expires IS NULL OR expires > ?)',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value, expires = row
+            if not isinstance(value, int):
+                raise TypeError(f"Value of key '{key}' is not an integer")
+        with self.local.lock:
+            self.local.own.add(stamp)
+        self._fill(seen, {key: (expires, value)})
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, self, version)
+        if value is self:
+            return False
+        self.set(key, value, timeout, version)
+        return True
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        rows = [(self._key(key, version), None, None) for key in keys]
+        if rows:
+            self._write(rows)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._read([key])
+
+    def clear(self):
+        connection = self.connection()
+        with transaction(connection):
+            connection.execute('DELETE FROM cache_entry')
+            stamp = self._next_stamp(connection)
+            connection.execute('UPDATE cache_meta SET horizon = stamp')
+        with self.local.lock:
+            self.local.entries.clear()
+            self.local.stamp = stamp
+            self.local.own = set()
@@ -0,0 +1,19 @@
+from .query_budget import check_query_budget, count_queries, log_queries
+
+
+class QueryBudgetMiddleware:
+    """Записывает число и время SQL-запросов каждого представления
+    и проверяет их по бюджету из settings.QUERY_BUDGETS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None:
+            log_queries(match.view_name, counter)
+            check_query_budget(match.view_name, counter)
+        return response
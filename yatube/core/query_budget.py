@@ -0,0 +1,73 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_COMMANDS = (
+    'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT'
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Считает SQL-запросы и их суммарное время через execute_wrapper.
+
+    Запросы к таблицам из QUERY_BUDGET_IGNORED_TABLES (служебные
+    хранилища вроде KV-хранилища sorl-thumbnail) и команды управления
+    транзакциями считаются отдельно и в бюджет не входят.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.ignored = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.monotonic() - start
+            if self.is_service(sql):
+                self.ignored += 1
+            else:
+                self.count += 1
+
+    @staticmethod
+    def is_service(sql):
+        if sql.startswith(TRANSACTION_COMMANDS):
+            return True
+        return any(f'"{table}"' in sql
+                   for table in settings.QUERY_BUDGET_IGNORED_TABLES)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def check_query_budget(view_name, counter):
+    """Сравнивает число запросов представления с его бюджетом."""
+    budget = settings.QUERY_BUDGETS.get(view_name)
+    if budget is None or counter.count <= budget:
+        return
+    message = (f'{view_name}: {counter.count} SQL-запросов '
+               f'при бюджете {budget}')
+    if settings.QUERY_BUDGET_ENFORCE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def log_queries(view_name, counter):
+    logger.info('%s: %d SQL-запросов (+%d служебных) за %.1f мс',
+                view_name, counter.count, counter.ignored,
+                counter.duration * 1000)
@@ -1,6 +1,14 @@
-from django.test import Client, TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
 
-from posts.tests.test_config import UNEXISTING_PAGE_URL
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from core import cache as two_tier
+from core.query_budget import QueryBudgetExceeded
+from posts.tests.test_config import INDEX_REVERSE, UNEXISTING_PAGE_URL
 
 
 class CustomERRORPagesTest(TestCase):
@@ -10,3 +18,120 @@ class CustomERRORPagesTest(TestCase):
     def test_404_use_correct_template(self):
         response = self.guest_client.get(UNEXISTING_PAGE_URL)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+
+    @override_settings(QUERY_BUDGETS={'posts:index': -1},
+                       QUERY_BUDGET_ENFORCE=True)
+    def test_exceeded_budget_fails_request(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.guest_client.get(INDEX_REVERSE)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': -1},
+                       QUERY_BUDGET_ENFORCE=False)
+    def test_exceeded_budget_is_logged(self):
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            self.guest_client.get(INDEX_REVERSE)
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+        self.first = self.process()
+        self.second = self.process()
+
+    def process(self, **options):
+        """Кэш с собственным первым уровнем, как в отдельном процессе."""
+        backend = two_tier.TwoTierCache(self.location, {'OPTIONS': options})
+        two_tier._shared.pop(self.location)
+        return backend
+
+    def test_values_are_shared_between_processes(self):
+        self.first.set('key', {'value': 1})
+        self.assertEqual(self.second.get('key'), {'value': 1})
+        self.assertEqual(self.second.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+
+    def test_local_hit_does_not_read_file(self):
+        self.first.set('key', 'value')
+        with sqlite3.connect(self.location) as connection:
+            connection.execute('UPDATE cache_entry SET value = NULL')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_writes_invalidate_other_processes(self):
+        """Изменение, удаление и очистка в одном процессе видны
+        в другом, хотя значение уже лежало в его первом уровне.
+        """
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.second.set('key', 'value')
+        self.assertEqual(self.first.get('key'), 'value')
+        self.second.clear()
+        self.assertIsNone(self.first.get('key'))
+
+    def test_add_keeps_existing_value(self):
+        self.assertTrue(self.first.add('key', 'first'))
+        self.assertFalse(self.second.add('key', 'second'))
+        self.assertEqual(self.second.get('key'), 'first')
+        self.first.delete('key')
+        self.assertTrue(self.second.add('key', 'second'))
+        self.assertEqual(self.first.get('key'), 'second')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Одновременные incr из разных процессов не теряют друг друга,
+        а первый уровень каждого видит итоговое значение.
+        """
+        self.first.set('counter', 0)
+        self.assertEqual(self.second.get('counter'), 0)
+
+        def bump(backend):
+            for _ in range(50):
+                backend.incr('counter')
+        # Соединение SQLite открывается в том потоке, где используется.
+        threads = [threading.Thread(target=bump, args=(self.process(),))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for backend in (self.first, self.second):
+            self.assertEqual(backend.get('counter'), 100)
+        self.assertEqual(self.second.decr('counter', 10), 90)
+        self.assertEqual(self.first.get('counter'), 90)
+        with self.assertRaises(ValueError):
+            self.first.incr('missing')
+
+    def test_expired_values_are_missing(self):
+        self.first.set('key', 'value', timeout=-1)
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.second.get('key'))
+        self.assertTrue(self.first.add('key', 'fresh'))
+
+    def test_returned_values_are_copies(self):
+        self.first.set('key', ['value'])
+        self.first.get('key').append('changed')
+        self.assertEqual(self.first.get('key'), ['value'])
+
+    def test_cull_invalidates_local_entries_everywhere(self):
+        backend = two_tier.TwoTierCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}
+        })
+        self.second.set('key', 'old')
+        self.assertEqual(self.first.get('key'), 'old')
+        for number in range(two_tier.CULL_CHECK_EVERY):
+            backend.set(f'filler:{number}', number)
+        with sqlite3.connect(self.location) as connection:
+            count, = connection.execute(
+                'SELECT count(*) FROM cache_entry'
+            ).fetchone()
+        self.assertLessEqual(count, two_tier.CULL_CHECK_EVERY)
+        self.assertIsNone(self.first.get('key'))
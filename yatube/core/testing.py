@@ -0,0 +1,42 @@
+"""Тесты пишут в собственный временный файл кэша: общий кэш сервера
+они не очищают и чужих id в нём не оставляют.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+SHARED_BACKEND = 'core.cache.TwoTierCache'
+
+
+@contextmanager
+def temporary_cache():
+    """Переключает файловые кэши CACHES во временный каталог."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = copy.deepcopy(settings.CACHES)
+    for params in caches.values():
+        if params['BACKEND'] == SHARED_BACKEND:
+            params['LOCATION'] = os.path.join(
+                directory, os.path.basename(params['LOCATION'])
+            )
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_override = ExitStack()
+        self.cache_override.enter_context(temporary_cache())
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.close()
+        super().teardown_test_environment(**kwargs)
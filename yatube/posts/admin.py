@@ -1,9 +1,22 @@
 from django.contrib import admin
 
 from .models import Comment, Group, Follow, Post
+from .search import matching, to_match
 
 
-class PostAdmin(admin.ModelAdmin):
+class SearchIndexMixin:
+    """Поиск в админке по индексу FTS5 вместо LIKE по search_fields."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        match = to_match(search_term)
+        if match is None:
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching(queryset.model, match)), False
+
+
+class PostAdmin(SearchIndexMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
     search_fields = ('text',)
@@ -16,7 +29,7 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ('description',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(SearchIndexMixin, admin.ModelAdmin):
     list_display = ('post', 'author', 'text', 'created')
     search_fields = ('text',)
 
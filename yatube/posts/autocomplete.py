@@ -0,0 +1,191 @@
+"""Подсказки по началу имени пользователя, полного имени и названия
+группы из индекса в памяти процесса.
+
+Индекс строится из базы при первом обращении и дальше обновляется
+сигналами после фиксации транзакции. Каждое изменение получает номер
+из счётчика поколения autocomplete и записывается в общий кэш под этим
+номером; процессы дочитывают пропущенные изменения перед поиском и
+перестраивают индекс из базы, только если журнал неполон.
+"""
+import threading
+from bisect import bisect_left, insort
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils.http import RFC3986_SUBDELIMS
+
+from yatube.settings import (AUTOCOMPLETE_CHANGE_TIMEOUT,
+                             AUTOCOMPLETE_MAX_CHANGES)
+from .cache import get_generation, next_generation
+from .models import Group, User
+
+GENERATION = 'autocomplete'
+CHANGE_KEY = 'autocomplete:change:{}'
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def word_starts(text):
+    """Ключи для поиска с начала любого слова: «иван петров» находится
+    и по «ив», и по «пе».
+    """
+    words = normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """Отсортированный список пар (ключ, id записи) с поиском по префиксу
+    через bisect.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {ident: (sorted(set(names)), result)
+                        for ident, names, result in entries}
+        # Сортировка всех ключей разом в разы быстрее вставки по одному.
+        self.keys = sorted(
+            (name, ident)
+            for ident, (names, _) in self.entries.items() for name in names
+        )
+
+    def add(self, ident, names, result):
+        self.remove(ident)
+        names = sorted(set(names))
+        for name in names:
+            insort(self.keys, (name, ident))
+        self.entries[ident] = names, result
+
+    def remove(self, ident):
+        names, _ = self.entries.pop(ident, ((), None))
+        for name in names:
+            position = bisect_left(self.keys, (name, ident))
+            if (position < len(self.keys)
+                    and self.keys[position] == (name, ident)):
+                del self.keys[position]
+
+    def search(self, prefix, limit):
+        found = {}
+        position = bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and len(found) < limit:
+            name, ident = self.keys[position]
+            if not name.startswith(prefix):
+                break
+            found.setdefault(ident, self.entries[ident][1])
+            position += 1
+        return list(found.values())
+
+
+def user_entry(pk, username, first_name, last_name):
+    full_name = f'{first_name} {last_name}'.strip()
+    names = word_starts(username) + word_starts(full_name)
+    return ('user', pk), names, ('user', full_name or username, username)
+
+
+def group_entry(pk, title, slug):
+    return ('group', pk), word_starts(title), ('group', title, slug)
+
+
+URL_NAMES = {'user': 'posts:profile', 'group': 'posts:group_posts'}
+URL_PLACEHOLDER = 'value'
+# Так же кодирует аргументы reverse.
+URL_SAFE = RFC3986_SUBDELIMS + '/~:@'
+
+
+def to_json(results):
+    """Результаты с адресами. reverse вызывается по разу на вид записи,
+    а не на каждую запись: иначе он стоил бы больше самого поиска.
+    """
+    urls = {kind: reverse(name, args=[URL_PLACEHOLDER]).split(
+        URL_PLACEHOLDER
+    ) for kind, name in URL_NAMES.items()}
+    return [{
+        'type': kind,
+        'label': label,
+        'value': value,
+        'url': quote(value, safe=URL_SAFE).join(urls[kind]),
+    } for kind, label, value in results]
+
+
+class Autocomplete:
+    def __init__(self):
+        self.index = None
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        users = User.objects.values_list('pk', 'username', 'first_name',
+                                         'last_name')
+        groups = Group.objects.values_list('pk', 'title', 'slug')
+        return PrefixIndex(
+            [user_entry(*row) for row in users.iterator()]
+            + [group_entry(*row) for row in groups.iterator()]
+        )
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        generation = get_generation(GENERATION)
+        with self.lock:
+            if self.index is None or not self.catch_up(generation):
+                self.index = self.build()
+                self.generation = generation
+            results = self.index.search(prefix, limit)
+        return to_json(results)
+
+    def catch_up(self, generation):
+        """Применяет к индексу изменения из кэша между своим поколением
+        и generation. False, если какого-то изменения там уже нет.
+        """
+        numbers = range(self.generation + 1, generation + 1)
+        if generation < self.generation or (
+                len(numbers) > AUTOCOMPLETE_MAX_CHANGES):
+            return False
+        keys = [CHANGE_KEY.format(number) for number in numbers]
+        found = cache.get_many(keys)
+        if len(found) < len(keys):
+            return False
+        for key in keys:
+            ident, entry = found[key]
+            if entry is None:
+                self.index.remove(ident)
+            else:
+                self.index.add(ident, *entry)
+        self.generation = generation
+        return True
+
+    def update(self, ident, entry=None):
+        """Записывает изменение в журнал после фиксации транзакции;
+        entry None удаляет запись. Индексы всех процессов, включая
+        этот, применят его при следующем поиске.
+        """
+        transaction.on_commit(lambda: self.publish(ident, entry))
+
+    def publish(self, ident, entry):
+        number = next_generation(GENERATION)
+        # Без номера изменение не записать: процессы перестроят индекс
+        # по новому поколению.
+        if number is not None:
+            cache.set(CHANGE_KEY.format(number), (ident, entry),
+                      AUTOCOMPLETE_CHANGE_TIMEOUT)
+
+
+autocomplete = Autocomplete()
+
+
+def update_user(user):
+    ident, *entry = user_entry(user.pk, user.username, user.first_name,
+                               user.last_name)
+    autocomplete.update(ident, entry)
+
+
+def update_group(group):
+    ident, *entry = group_entry(group.pk, group.title, group.slug)
+    autocomplete.update(ident, entry)
+
+
+def remove(kind, pk):
+    autocomplete.update((kind, pk))
@@ -0,0 +1,265 @@
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from yatube.settings import (ANONYMOUS_CACHE_TIMEOUT, STAMPEDE_BETA,
+                             STAMPEDE_LOCK_TIMEOUT, STAMPEDE_POLL_INTERVAL,
+                             STAMPEDE_STALE_TIMEOUT, STAMPEDE_WAIT)
+from .models import Group, Post, User
+
+GENERATION_KEY = 'generation:{}'
+RESPONSE_KEY = 'response:{}'
+LOOKUP_KEY = 'lookup:{}:{}'
+LOCK_KEY = 'lock:{}'
+
+
+def get_generation(name):
+    """Текущее поколение данных; входит в ключи зависимых записей кэша."""
+    return get_generations([name])[name]
+
+
+def get_generations(names):
+    """Поколения нескольких сущностей за одно обращение к кэшу."""
+    keys = {GENERATION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _fresh_generation(), None)
+        found[key] = cache.get(key)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def bump_generation(*names):
+    """Делает устаревшими все записи кэша, собранные на старом поколении."""
+    for name in names:
+        next_generation(name)
+
+
+def next_generation(name):
+    """Сменяет поколение name и возвращает новое; None, если счётчик
+    пришлось завести заново.
+    """
+    key = GENERATION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Если счётчик вытеснили из кэша, новое значение не должно
+        # совпасть ни с одним из уже использованных, поэтому берём его
+        # от времени.
+        cache.set(key, _fresh_generation(), None)
+        return None
+
+
+def get_versioned(generation, keys):
+    """Значения keys, сохранённые на текущем поколении generation.
+
+    Поколение читается тем же get_many, что и сами значения, поэтому
+    сброс всех записей разом не стоит лишнего обращения к кэшу.
+    """
+    generation_key = GENERATION_KEY.format(generation)
+    found = cache.get_many([generation_key, *keys])
+    current = found.pop(generation_key, None)
+    if current is None:
+        current = get_generation(generation)
+    return current, {key: value for key, (version, value) in found.items()
+                     if version == current}
+
+
+def set_versioned(version, mapping, timeout):
+    cache.set_many(
+        {key: (version, value) for key, value in mapping.items()}, timeout
+    )
+
+
+@contextmanager
+def locked(key, wait=STAMPEDE_WAIT):
+    """Блокировка key между процессами через cache.add. Отдаёт True,
+    если её удалось взять за wait секунд, иначе False.
+    """
+    lock = LOCK_KEY.format(key)
+    deadline = time.monotonic() + wait
+    while not cache.add(lock, True, STAMPEDE_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(STAMPEDE_POLL_INTERVAL)
+    try:
+        yield True
+    finally:
+        cache.delete(lock)
+
+
+def single_flight(key, version, compute, timeout, cacheable=None):
+    """Значение из кэша или compute(), который для одного ключа
+    выполняет только один процесс за раз.
+
+    Запись хранит версию, мягкий срок и время расчёта. Незадолго до срока
+    запись пересчитывается заранее с вероятностью, растущей тем быстрее,
+    чем дольше расчёт (XFetch). Пока один процесс пересчитывает запись
+    после срока или смены версии, остальные отдают прежнее значение; если
+    его нет, ждут результат до STAMPEDE_WAIT секунд. cacheable(value)
+    решает, сохранять ли результат.
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version):
+        return entry[1]
+    lock = LOCK_KEY.format(key)
+    if cache.add(lock, True, STAMPEDE_LOCK_TIMEOUT):
+        try:
+            return _recompute(key, version, compute, timeout, cacheable)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        return entry[1]
+    deadline = time.monotonic() + STAMPEDE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(STAMPEDE_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+    # Пересчёт затянулся или процесс с блокировкой упал.
+    return compute()
+
+
+def _is_fresh(entry, version):
+    stored, _, expires, delta = entry
+    # 1 - random() лежит в (0, 1], поэтому логарифм определён.
+    early = -delta * STAMPEDE_BETA * math.log(1 - random.random())
+    return stored == version and time.time() + early < expires
+
+
+def _recompute(key, version, compute, timeout, cacheable):
+    start = time.monotonic()
+    value = compute()
+    if cacheable is None or cacheable(value):
+        expires = math.inf if timeout is None else time.time() + timeout
+        cache.set(
+            key, (version, value, expires, time.monotonic() - start),
+            None if timeout is None else timeout + STAMPEDE_STALE_TIMEOUT
+        )
+    return value
+
+
+def _fresh_generation():
+    return int(time.time() * 1000)
+
+
+def lookup(kind, value, resolve):
+    """Кэширует неизменяемое соответствие, например slug группы -> id."""
+    key = LOOKUP_KEY.format(kind, value)
+    result = cache.get(key)
+    if result is None:
+        result = resolve(value)
+        if result is not None:
+            cache.set(key, result, None)
+    return result
+
+
+def forget(kind, value):
+    cache.delete(LOOKUP_KEY.format(kind, value))
+
+
+def _fingerprint(names, *extra):
+    generations = get_generations(names)
+    raw = '|'.join(
+        [str(value) for value in extra]
+        + [f'{name}={generations[name]}' for name in names]
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_etag(dependencies):
+    """Строит функцию ETag для django.views.decorators.http.condition.
+
+    Валидатор собирается только из поколений в кэше, поэтому ответ
+    304 Not Modified не требует ни запросов к базе, ни рендера шаблона.
+    """
+    def etag(request, *args, **kwargs):
+        names = dependencies(**kwargs)
+        if names is None:
+            return None
+        viewer = ''
+        if request.user.is_authenticated:
+            viewer = request.user.pk
+            names = names + [f'viewer:{viewer}']
+        return _fingerprint(
+            names, viewer, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        )
+    return etag
+
+
+def cache_anonymous(dependencies):
+    """Кэширует ответы анонимным посетителям целиком.
+
+    dependencies(**kwargs) возвращает имена поколений, от которых зависит
+    страница, или None, если зависимости определить не удалось. Изменение
+    любой из сущностей меняет версию записи, и страница собирается заново
+    через single_flight: один запрос пересобирает, остальные получают
+    прежний ответ.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            names = dependencies(**kwargs)
+            if names is None:
+                return view(request, *args, **kwargs)
+            return single_flight(
+                response_key(request.get_full_path()), _fingerprint(names),
+                lambda: view(request, *args, **kwargs),
+                ANONYMOUS_CACHE_TIMEOUT, _is_cacheable
+            )
+        return wrapper
+    return decorator
+
+
+def response_key(path):
+    # Версия хранится в записи, а не в ключе: после изменения страницы
+    # прежний ответ остаётся под рукой, пока новый собирается.
+    return RESPONSE_KEY.format(hashlib.md5(path.encode()).hexdigest())
+
+
+def _is_cacheable(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def _first_pk(queryset):
+    return queryset.values_list('pk', flat=True).first()
+
+
+def index_dependencies():
+    return ['site', 'feed']
+
+
+def group_dependencies(slug):
+    group_id = lookup(
+        'group', slug, lambda slug: _first_pk(Group.objects.filter(slug=slug))
+    )
+    return None if group_id is None else ['site', f'group:{group_id}']
+
+
+def profile_dependencies(username):
+    author_id = lookup(
+        'user', username,
+        lambda username: _first_pk(User.objects.filter(username=username))
+    )
+    return None if author_id is None else ['site', f'author:{author_id}']
+
+
+def post_dependencies(post_id):
+    author_id = lookup(
+        'post-author', post_id,
+        lambda post_id: Post.objects.filter(
+            pk=post_id
+        ).values_list('author', flat=True).first()
+    )
+    if author_id is None:
+        return None
+    return ['site', f'post:{post_id}', f'author:{author_id}']
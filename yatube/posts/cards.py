@@ -0,0 +1,100 @@
+import logging
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from yatube.settings import POST_CARD_CACHE_TIMEOUT
+from .cache import get_generations
+from .templatetags.post_images import POST_IMAGE_TEMPLATE, post_image
+from .thumbnails import prefetch_variants
+
+logger = logging.getLogger(__name__)
+
+CARD_KEY = 'card:{}:{}:{}'
+CARD_TEMPLATE = 'posts/includes/post_item.html'
+# id, который подставляется в reverse, а затем заменяется id поста.
+PK_PLACEHOLDER = 2 ** 31 - 1
+
+
+def card_dependencies(post):
+    """Поколения, от которых зависит карточка поста: сам пост, имя автора
+    и название группы. Общее поколение cards сбрасывает все карточки
+    после массовых изменений в обход сигналов.
+    """
+    names = ['cards', f'post-card:{post.pk}',
+             f'author-cards:{post.author_id}']
+    if post.group_id is not None:
+        names.append(f'group-cards:{post.group_id}')
+    return names
+
+
+def render_cards(posts, layout):
+    """HTML карточек постов в том же порядке.
+
+    Готовые карточки читаются из кэша одним get_many; рендерятся
+    и сохраняются только недостающие.
+    """
+    posts = list(posts)
+    dependencies = {post.pk: card_dependencies(post) for post in posts}
+    generations = get_generations(
+        {name for names in dependencies.values() for name in names}
+    )
+    keys = {
+        post.pk: CARD_KEY.format(layout, post.pk, '.'.join(
+            [str(post.group_id)]
+            + [str(generations[name]) for name in dependencies[post.pk]]
+        ))
+        for post in posts
+    }
+    cards = cache.get_many(keys.values())
+    missing = [post for post in posts if keys[post.pk] not in cards]
+    if missing:
+        rendered = dict(zip(
+            (keys[post.pk] for post in missing),
+            render_uncached(missing, layout)
+        ))
+        cache.set_many(rendered, POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[keys[post.pk]]) for post in posts]
+
+
+def render_uncached(posts, layout):
+    """HTML карточек в обход кэша.
+
+    Шаблоны загружаются один раз на страницу, а адреса и имена авторов
+    и групп вычисляются по одному разу на каждого автора и группу,
+    поэтому в цикле по постам не остаётся include и url.
+    """
+    try:
+        prefetch_variants(posts)
+    except Exception:
+        logger.exception('Не удалось загрузить метаданные картинок')
+    authors = {post.author_id: post.author for post in posts}
+    author_names = {pk: author.get_full_name() or author.username
+                    for pk, author in authors.items()}
+    profile_urls = {pk: reverse('posts:profile', args=[author.username])
+                    for pk, author in authors.items()}
+    # Группа могла быть удалена после того, как пост попал в кэш.
+    group_urls = {post.group_id: reverse('posts:group_posts',
+                                         args=[post.group.slug])
+                  for post in posts
+                  if post.group_id is not None and post.group is not None}
+    detail_url = reverse(
+        'posts:post_detail', args=[PK_PLACEHOLDER]
+    ).replace(str(PK_PLACEHOLDER), '{}')
+    card_template = get_template(CARD_TEMPLATE)
+    image_template = get_template(POST_IMAGE_TEMPLATE)
+    return [
+        card_template.render({
+            'post': post,
+            'layout': layout,
+            'author_name': author_names[post.author_id],
+            'profile_url': profile_urls[post.author_id],
+            'group_url': group_urls.get(post.group_id),
+            'detail_url': detail_url.format(post.pk),
+            'image': image_template.render(post_image(post)),
+        })
+        for post in posts
+    ]
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from yatube.settings import COUNTERS_BATCH_SIZE
+from .models import Comment, Follow, Group, MediaFile, Post, UserStats
+
+USER_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _deltas(**deltas):
+    # Счётчик не уходит в минус, даже если успел разойтись с данными:
+    # расхождение исправит команда recount.
+    return {
+        field: (F(field) + delta if delta > 0
+                else Greatest(F(field) + delta, 0))
+        for field, delta in deltas.items()
+    }
+
+
+def bump_user(user_id, **deltas):
+    # Строки статистики может не быть: например, её уже удалил каскад
+    # при удалении пользователя. Недостающую строку восстановит get_stats
+    # при чтении, а не сигнал, иначе она помешает удалению.
+    UserStats.objects.filter(user_id=user_id).update(**_deltas(**deltas))
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            **_deltas(posts_count=delta)
+        )
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(**_deltas(comments_count=delta))
+
+
+def acquire_file(name):
+    if not name:
+        return
+    _, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'references': 1}
+    )
+    if not created:
+        MediaFile.objects.filter(name=name).update(
+            **_deltas(references=1)
+        )
+
+
+def release_file(name):
+    """Снимает ссылку на файл; True, если ссылок больше не осталось."""
+    if not name:
+        return False
+    MediaFile.objects.filter(name=name).update(**_deltas(references=-1))
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    return bool(deleted)
+
+
+def get_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        recount_users([user.pk])
+        return UserStats.objects.get(user=user)
+
+
+def _count_by(queryset, field):
+    return dict(
+        queryset.order_by().values_list(field).annotate(Count('pk'))
+    )
+
+
+def recount_users(user_ids):
+    posts = _count_by(Post.objects.filter(author__in=user_ids), 'author')
+    followers = _count_by(
+        Follow.objects.filter(author__in=user_ids), 'author'
+    )
+    following = _count_by(Follow.objects.filter(user__in=user_ids), 'user')
+    existing = set(
+        UserStats.objects.filter(
+            user__in=user_ids
+        ).values_list('user', flat=True)
+    )
+    stats = [
+        UserStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0)
+        )
+        for user_id in user_ids
+    ]
+    UserStats.objects.bulk_create(
+        [item for item in stats if item.user_id not in existing],
+        ignore_conflicts=True
+    )
+    UserStats.objects.bulk_update(
+        [item for item in stats if item.user_id in existing], USER_COUNTERS
+    )
+
+
+def recount_groups(group_ids):
+    posts = _count_by(Post.objects.filter(group__in=group_ids), 'group')
+    Group.objects.bulk_update(
+        [Group(pk=group_id, posts_count=posts.get(group_id, 0))
+         for group_id in group_ids],
+        ('posts_count',)
+    )
+
+
+def recount_posts(post_ids):
+    comments = _count_by(Comment.objects.filter(post__in=post_ids), 'post')
+    Post.objects.bulk_update(
+        [Post(pk=post_id, comments_count=comments.get(post_id, 0))
+         for post_id in post_ids],
+        ('comments_count',)
+    )
+
+
+def recount_files():
+    """Пересобирает счётчики ссылок на файлы по картинкам постов."""
+    references = _count_by(Post.objects.exclude(image=''), 'image')
+    with transaction.atomic():
+        MediaFile.objects.all().delete()
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name, references=count)
+             for name, count in references.items()],
+            batch_size=COUNTERS_BATCH_SIZE
+        )
+
+
+def iter_batches(model, batch_size):
+    """Перебирает первичные ключи таблицы пачками по возрастанию."""
+    last = 0
+    while True:
+        batch = list(
+            model.objects.filter(pk__gt=last).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
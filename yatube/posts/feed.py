@@ -0,0 +1,167 @@
+from yatube.settings import (FEED_BACKFILL_SIZE, FEED_BATCH_SIZE,
+                             FEED_FANOUT_LIMIT, FEED_PUSH_LIMIT)
+from . import lists
+from .models import FeedItem, Follow, Post, UserStats
+from .utils import KeysetPaginator
+
+
+def is_pull_author(author_id):
+    """Посты автора с огромным числом подписчиков читаются при запросе."""
+    return UserStats.objects.filter(
+        user_id=author_id, pull_feed=True
+    ).exists()
+
+
+def pull_author_ids(user):
+    return list(
+        UserStats.objects.filter(
+            user__in=user.follower.values('author'), pull_feed=True
+        ).values_list('user', flat=True)
+    )
+
+
+def _insert(items):
+    FeedItem.objects.bulk_create(
+        items, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def feed_name(user_id):
+    return f'follow:{user_id}'
+
+
+def push_followers(author_id):
+    """Подписчики автора, в ленты которых его посты раскладываются
+    при записи; у авторов с огромным числом подписчиков — никто.
+    """
+    if is_pull_author(author_id):
+        return []
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = push_followers(post.author_id)
+    _insert(
+        FeedItem(user_id=user_id, post=post, author_id=post.author_id,
+                 pub_date=post.pub_date)
+        for user_id in followers
+    )
+    lists.add_post(post, lists.feed_names(post)
+                   + [feed_name(user_id) for user_id in followers])
+
+
+def on_delete(post):
+    lists.remove_post(post, lists.feed_names(post) + [
+        feed_name(user_id) for user_id in push_followers(post.author_id)
+    ])
+
+
+def backfill(user_ids, author_id):
+    """Добавляет в ленты последние посты автора, например при подписке."""
+    posts = list(
+        Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', 'pub_date')[:FEED_BACKFILL_SIZE]
+    )
+    for user_id in user_ids:
+        _insert(
+            FeedItem(user_id=user_id, post_id=post_id, author_id=author_id,
+                     pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+
+
+def trim(user_id, author_id):
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _switch(author_id, pull):
+    """Переключает режим автора; True только у одного из одновременных
+    запросов, который и должен довести ленты до нового режима.
+    """
+    return bool(UserStats.objects.filter(
+        user_id=author_id, pull_feed=not pull
+    ).update(pull_feed=pull))
+
+
+def mark_pull_authors():
+    """Переводит на чтение при запросе авторов, у которых подписчиков
+    больше FEED_FANOUT_LIMIT, например после массовой загрузки.
+    """
+    UserStats.objects.filter(
+        followers_count__gt=FEED_FANOUT_LIMIT, pull_feed=False
+    ).update(pull_feed=True)
+
+
+def on_follow(follow):
+    author_id = follow.author_id
+    # Подписчиков считаем по таблице подписок, а не по счётчику: так не
+    # важно, успел ли его обновить другой обработчик сигнала. Уже
+    # разложенные посты автора, ставшего популярным, остаются в лентах:
+    # при чтении они сливаются с подмешанными без повторов.
+    if not is_pull_author(author_id) and (
+        Follow.objects.filter(author_id=author_id).count()
+        <= FEED_FANOUT_LIMIT or not _switch(author_id, pull=True)
+    ):
+        backfill([follow.user_id], author_id)
+    lists.forget_feeds([feed_name(follow.user_id)])
+
+
+def on_unfollow(follow):
+    author_id = follow.author_id
+    trim(follow.user_id, author_id)
+    lists.forget_feeds([feed_name(follow.user_id)])
+    if (is_pull_author(author_id)
+            and Follow.objects.filter(author_id=author_id).count()
+            <= FEED_PUSH_LIMIT and _switch(author_id, pull=False)):
+        # Автор вернулся к раскладке при записи: посты, которые читались
+        # при запросе, нужно разложить по лентам оставшихся подписчиков.
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user', flat=True))
+        backfill(followers, author_id)
+        lists.forget_feeds(feed_name(user_id) for user_id in followers)
+
+
+class FeedPaginator(lists.CachedIdsMixin, KeysetPaginator):
+    """Лента подписок: материализованная таблица плюс посты авторов,
+    которые читаются при запросе. Обе части перебираются по одному
+    и тому же ключу (pub_date, id) и сливаются в памяти.
+
+    Начало ленты без таких авторов берётся из кэша списков id.
+    """
+
+    def __init__(self, user, per_page):
+        self.items = FeedItem.objects.filter(user=user).select_related(
+            'post__author', 'post__group'
+        ).order_by('-pub_date', '-post_id')
+        pulled = pull_author_ids(user)
+        posts = (Post.objects.filter(author__in=pulled) if pulled
+                 else Post.objects.none())
+        if not pulled:
+            self.feed = feed_name(user.pk)
+        super().__init__(posts.select_related('author', 'group'), per_page)
+
+    def window(self, limit):
+        return [item.post for item in self.items[:limit]]
+
+    def fetch_uncached(self, position, backwards, limit):
+        items = self.items
+        if position is not None:
+            items = self.seek(
+                items, position, backwards, pk_field='post_id'
+            )
+        if backwards:
+            items = items.reverse()
+        rows = {item.post_id: item.post for item in items[:limit]}
+        if self.object_list.query.is_empty():
+            return list(rows.values())
+        for post in KeysetPaginator.fetch(self, position, backwards, limit):
+            rows.setdefault(post.pk, post)
+        return sorted(
+            rows.values(), key=self.key,
+            reverse=self.descending != backwards
+        )[:limit]
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
+from .uploads import EMPTY_DESCRIPTION, make_master
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            image, description = make_master(image)
+        elif not image:
+            description = EMPTY_DESCRIPTION
+        else:
+            return image
+        for field, value in description.items():
+            setattr(self.instance, field, value)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
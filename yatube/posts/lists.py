@@ -0,0 +1,248 @@
+"""Кэш упорядоченных списков id постов для лент и самих объектов.
+
+Для каждой ленты (главная, группа, автор, подписки читателя) в кэше
+лежит начало ленты — пары (дата, id) первых FEED_ID_PAGES страниц.
+Страницы внутри этого окна собираются из кэша объектов одним get_many,
+недостающие посты догружаются одним запросом id__in. Новые и удалённые
+посты правят списки на месте, а не сбрасывают их. Список читается,
+правится и записывается под блокировкой ключа: иначе одновременная
+правка или построение списка записали бы его без чужого поста.
+"""
+import copy
+
+from django.core.cache import cache
+
+from yatube.settings import (AMOUNT_OF_POSTS, FEED_ID_PAGES,
+                             FEED_IDS_TIMEOUT, OBJECT_CACHE_TIMEOUT)
+from .cache import (LOCK_KEY, bump_generation, get_generation,
+                    get_versioned, locked, set_versioned)
+from .models import Group, Post, User
+from .utils import KeysetPaginator
+
+IDS_KEY = 'ids:{}'
+POST_KEY = 'object:post:{}'
+RELATED_KEYS = {User: 'object:user:{}', Group: 'object:group:{}'}
+# Поколения сбрасывают все списки или все объекты после массовых
+# изменений в обход сигналов.
+IDS_GENERATION = 'feed-ids'
+OBJECTS_GENERATION = 'objects'
+# Лишняя строка нужна, чтобы и на последней странице окна знать,
+# есть ли следующая.
+MAX_ROWS = FEED_ID_PAGES * AMOUNT_OF_POSTS + 1
+
+
+def feed_names(post):
+    names = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        names.append(f'group:{post.group_id}')
+    return names
+
+
+def _strip(obj):
+    """Копия объекта без подгруженных связей: автор и группа кэшируются
+    отдельно и сбрасываются своими сигналами.
+    """
+    stripped = copy.copy(obj)
+    stripped._state = copy.copy(obj._state)
+    stripped._state.fields_cache = {}
+    return stripped
+
+
+def store_objects(version, posts):
+    """Кладёт в кэш посты и отдельно их авторов и группы."""
+    stored = {}
+    for post in posts:
+        stored[POST_KEY.format(post.pk)] = _strip(post)
+        stored[RELATED_KEYS[User].format(post.author_id)] = post.author
+        if post.group_id is not None:
+            stored[RELATED_KEYS[Group].format(post.group_id)] = post.group
+    set_versioned(version, stored, OBJECT_CACHE_TIMEOUT)
+
+
+def hydrate(pks):
+    """Посты с авторами и группами в порядке pks; удалённые пропускаются."""
+    keys = {pk: POST_KEY.format(pk) for pk in pks}
+    version, found = get_versioned(OBJECTS_GENERATION, keys.values())
+    posts = {pk: found[key] for pk, key in keys.items() if key in found}
+    related = {User: {}, Group: {}}
+    missing = [pk for pk in pks if pk not in posts]
+    if missing:
+        # Промах догружается одним запросом вместе с авторами и группами.
+        loaded = Post.objects.select_related('author', 'group').in_bulk(
+            missing
+        )
+        store_objects(version, loaded.values())
+        for post in loaded.values():
+            related[User][post.author_id] = post.author
+            if post.group_id is not None:
+                related[Group][post.group_id] = post.group
+        posts.update(loaded)
+    _load_related(posts.values(), related, version)
+    for post in posts.values():
+        post.author = related[User][post.author_id]
+        if post.group_id is not None:
+            # Группа могла быть удалена: её посты обнуляются запросом
+            # без сигналов, и в кэше остаётся прежний group_id.
+            post.group = related[Group].get(post.group_id)
+    return [posts[pk] for pk in pks if pk in posts]
+
+
+def _load_related(posts, related, version):
+    """Дополняет related авторами и группами постов: из кэша одним
+    get_many, недостающих — запросом на каждую модель.
+    """
+    wanted = {}
+    for post in posts:
+        for model, pk in ((User, post.author_id), (Group, post.group_id)):
+            if pk is not None and pk not in related[model]:
+                wanted[RELATED_KEYS[model].format(pk)] = model, pk
+    if not wanted:
+        return
+    _, found = get_versioned(OBJECTS_GENERATION, wanted)
+    loaded = {}
+    for model in related:
+        pks = [pk for key, (kind, pk) in wanted.items()
+               if kind is model and key not in found]
+        if pks:
+            loaded.update({RELATED_KEYS[model].format(pk): obj
+                           for pk, obj in model.objects.in_bulk(pks).items()})
+    set_versioned(version, loaded, OBJECT_CACHE_TIMEOUT)
+    for key, obj in {**found, **loaded}.items():
+        model, pk = wanted[key]
+        related[model][pk] = obj
+
+
+def forget_objects(model, pks):
+    """Удаляет объекты из кэша, например после их изменения."""
+    key = RELATED_KEYS.get(model, POST_KEY)
+    cache.delete_many([key.format(pk) for pk in pks])
+
+
+class CachedIdsMixin:
+    """Отдаёт страницы внутри закэшированного начала ленты без запросов
+    к таблице постов. Страницы за пределами окна читаются как обычно.
+
+    Подкласс задаёт feed (имя ленты или None, чтобы не кэшировать)
+    и window(limit) — первые limit постов ленты с авторами и группами.
+    """
+    feed = None
+
+    def window(self, limit):
+        return list(self.object_list[:limit])
+
+    def cached_rows(self):
+        key = IDS_KEY.format(self.feed)
+        version, found = get_versioned(IDS_GENERATION, [key])
+        if key not in found:
+            # Список строится тем же одним запросом, что и страница,
+            # и заодно прогревает кэш объектов для всего окна. Пока
+            # список правит другой процесс, он строится без записи.
+            with locked(key, wait=0) as acquired:
+                posts = self.window(MAX_ROWS + 1)
+                store_objects(get_generation(OBJECTS_GENERATION), posts)
+                rows = [self.key(post) for post in posts]
+                found[key] = len(rows) <= MAX_ROWS, rows[:MAX_ROWS]
+                if acquired:
+                    set_versioned(version, found, FEED_IDS_TIMEOUT)
+        return found[key]
+
+    def fetch(self, position, backwards, limit):
+        if self.feed is None or not self.descending:
+            return self.fetch_uncached(position, backwards, limit)
+        complete, rows = self.cached_rows()
+        start = 0
+        if position is not None:
+            # Строки идут от новых к старым: ищем первую не новее позиции.
+            start = next((i for i, row in enumerate(rows)
+                          if row <= position), len(rows))
+            if not backwards and start < len(rows) and rows[start] == position:
+                start += 1
+        if backwards:
+            if position is None:
+                start = len(rows)
+            # С конца ленты или от позиции старше всего окна: посты между
+            # ней и окном в неполный список не попали.
+            if start == len(rows) and not complete:
+                return self.fetch_uncached(position, backwards, limit)
+            selected = rows[max(0, start - limit):start][::-1]
+        else:
+            selected = rows[start:start + limit]
+            if len(selected) < limit and not complete:
+                return self.fetch_uncached(position, backwards, limit)
+        return hydrate([pk for _, pk in selected])
+
+    def fetch_uncached(self, position, backwards, limit):
+        return super().fetch(position, backwards, limit)
+
+
+class CachedKeysetPaginator(CachedIdsMixin, KeysetPaginator):
+    def __init__(self, object_list, per_page, feed, **kwargs):
+        self.feed = feed
+        super().__init__(object_list, per_page, **kwargs)
+
+
+def get_feed_page(request, queryset, feed, argument='page', count=None):
+    paginator = CachedKeysetPaginator(queryset, AMOUNT_OF_POSTS, feed,
+                                      count=count)
+    return paginator.get_page(request.GET.get(argument))
+
+
+def _busy_keys(feeds):
+    """Ключи списков, которые лежат в кэше или строятся сейчас: только
+    их нужно править под блокировкой.
+    """
+    keys = [IDS_KEY.format(feed) for feed in feeds]
+    found = cache.get_many(keys + [LOCK_KEY.format(key) for key in keys])
+    return [key for key in keys
+            if key in found or LOCK_KEY.format(key) in found]
+
+
+def _update(feeds, change):
+    """Применяет change(rows) к закэшированным спискам лент на месте."""
+    for key in _busy_keys(feeds):
+        with locked(key) as acquired:
+            if not acquired:
+                # Блокировку не отпускают: правку некуда применить, и все
+                # списки строятся заново.
+                bump_generation(IDS_GENERATION)
+                return
+            version, found = get_versioned(IDS_GENERATION, [key])
+            if key in found:
+                set_versioned(version, {key: change(*found[key])},
+                              FEED_IDS_TIMEOUT)
+
+
+def add_post(post, feeds):
+    row = post.pub_date, post.pk
+
+    def insert(complete, rows):
+        if row in rows:
+            # Список построили уже после сохранения поста.
+            return complete, rows
+        rows = list(rows)
+        position = next((i for i, other in enumerate(rows) if other < row),
+                        len(rows))
+        # Пост старше окна в неполный список не попадает: между ними
+        # могут быть посты, которых в кэше нет.
+        if position < len(rows) or complete:
+            rows.insert(position, row)
+        if len(rows) > MAX_ROWS:
+            return False, rows[:MAX_ROWS]
+        return complete, rows
+    _update(feeds, insert)
+
+
+def forget_feeds(feeds):
+    for key in _busy_keys(feeds):
+        with locked(key) as acquired:
+            if not acquired:
+                bump_generation(IDS_GENERATION)
+                return
+            cache.delete(key)
+
+
+def remove_post(post, feeds):
+    row = post.pub_date, post.pk
+    _update(feeds, lambda complete, rows: (
+        complete, [other for other in rows if other != row]
+    ))
@@ -0,0 +1,123 @@
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from core.query_budget import count_queries
+from posts import urls
+from posts.models import Follow, Group, Post, User
+from posts.resize import sign
+
+# Представления, которые открываются от имени автора или читателя;
+# остальные запрашиваются анонимно.
+AUTHOR_VIEWS = ('post_create', 'post_edit', 'add_comment')
+VIEWER_VIEWS = ('follow_index', 'profile_follow', 'profile_unfollow')
+# Представления, которые меняют данные даже на GET: каждый их запрос
+# выполняется в транзакции, которая затем откатывается.
+WRITE_VIEWS = ('profile_follow', 'profile_unfollow')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * rank // 100) - 1)
+    return ordered[index]
+
+
+def measure(client, url, rollback=False, prepare=None):
+    """Время GET-запроса в секундах и число выполненных SQL-запросов.
+    С rollback запрос и prepare выполняются в откатываемой транзакции.
+    """
+    with transaction.atomic() if rollback else nullcontext():
+        if prepare is not None:
+            prepare()
+        with count_queries() as counter:
+            start = time.perf_counter()
+            client.get(url)
+            elapsed = time.perf_counter() - start
+        if rollback:
+            transaction.set_rollback(True)
+    return elapsed, counter.count
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов для всех адресов '
+            'приложения posts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Сколько раз запрашивать каждый адрес')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом')
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').first()
+        if post is None:
+            raise CommandError('Нет постов: сначала выполните seed')
+        group = post.group or Group.objects.first()
+        viewer = User.objects.exclude(pk=post.author_id).exclude(
+            follower__author=post.author_id
+        ).first()
+        if group is None or viewer is None:
+            raise CommandError('Нужны хотя бы одна группа и два автора')
+        spec = f'{settings.POST_THUMBNAIL_GEOMETRY}.jpg'
+        arguments = {
+            'slug': group.slug,
+            'username': post.author.username,
+            'post_id': post.pk,
+            'spec': spec,
+            'signature': sign(post.image.name, spec),
+        }
+        query_strings = {
+            'search': {'q': post.text.split()[0]},
+            'suggest': {'q': post.author.username[:3]},
+        }
+        clients = {'guest': Client()}
+        for role, user in (('author', post.author), ('viewer', viewer)):
+            clients[role] = Client()
+            clients[role].force_login(user)
+
+        routes = []
+        for pattern in urls.urlpatterns:
+            kwargs = {name: arguments[name]
+                      for name in pattern.pattern.converters}
+            role = ('author' if pattern.name in AUTHOR_VIEWS
+                    else 'viewer' if pattern.name in VIEWER_VIEWS
+                    else 'guest')
+            url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+            if pattern.name in query_strings:
+                url += f'?{urlencode(query_strings[pattern.name])}'
+            routes.append((pattern.name, url, clients[role]))
+
+        # Отписываться есть от чего только внутри откатываемой транзакции.
+        prepare = {'profile_unfollow': lambda: Follow.objects.create(
+            user=viewer, author=post.author
+        )}
+        timings = {name: [] for name, _, _ in routes}
+        queries = {name: [] for name, _, _ in routes}
+        for _ in range(options['requests']):
+            for name, url, client in routes:
+                if options['cold']:
+                    cache.clear()
+                elapsed, count = measure(client, url,
+                                         rollback=name in WRITE_VIEWS,
+                                         prepare=prepare.get(name))
+                timings[name].append(elapsed)
+                queries[name].append(count)
+
+        header = ''.join(f'{f"p{rank}, мс":>10}' for rank in PERCENTILES)
+        self.stdout.write(f'{"адрес":<18}{header}{"запросы":>10}')
+        for name, _, _ in routes:
+            line = ''.join(
+                f'{percentile(timings[name], rank) * 1000:>10.1f}'
+                for rank in PERCENTILES
+            )
+            counts = f'{min(queries[name])}-{max(queries[name])}'
+            self.stdout.write(f'{name:<18}{line}{counts:>10}')
@@ -0,0 +1,119 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, engines
+
+from posts.cards import CARD_TEMPLATE, render_uncached
+from posts.models import Post
+from posts.thumbnails import prefetch_variants
+from .benchmark import PERCENTILES, percentile
+
+LAYOUTS = ('feed', 'group', 'profile')
+
+# Карточка в прежнем виде, с include и тегами url на каждый пост: с ней
+# сравнивается render_uncached.
+BASELINE_TEMPLATES = {
+    'posts/includes/post_card.html': '''<ul>
+  <li>
+    Автор:
+    {% if post.author.get_full_name %}
+      {{ post.author.get_full_name }}
+    {% else %}
+      {{ post.author.username }}
+    {% endif %}
+    <br>
+    <a href="{% url 'posts:profile' post.author.username %}">
+      все посты пользователя</a>
+  </li>
+  <li>
+    Дата публикации: {{ post.pub_date|date:"d E Y" }}
+  </li>
+</ul>''',
+    CARD_TEMPLATE: '''{% load post_images %}
+{% if layout == 'profile' %}
+  <article>
+    {% include "posts/includes/post_card.html" %}
+    {% post_image post %}
+    {{ post.text_html|safe }}
+    <a href="{% url 'posts:post_detail' post.pk %}">подробная информация </a>
+  </article>
+  {% if post.group %}
+    <a href="{% url 'posts:group_posts' post.group.slug %}">все записи группы
+      "{{ post.group.title }}"
+    </a>
+  {% endif %}
+{% else %}
+  {% include "posts/includes/post_card.html" %}
+  {% post_image post %}
+  {{ post.text_html|safe }}
+  {% if layout == 'group' %}
+    <a href="{% url 'posts:post_detail' post.pk %}">подробная информация</a>
+  {% elif post.group %}
+    <a href="{% url 'posts:group_posts' post.group.slug %}">
+      Все записи группы "{{ post.group.title }}"
+    </a>
+  {% endif %}
+{% endif %}''',
+}
+
+
+def baseline_engine():
+    """Движок шаблонов проекта, в котором карточка берётся из
+    BASELINE_TEMPLATES, а остальные шаблоны — из каталогов проекта.
+    """
+    engine = engines['django'].engine
+    loaders = [
+        ('django.template.loaders.locmem.Loader', BASELINE_TEMPLATES),
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]
+    if not engine.debug:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return Engine(dirs=engine.dirs, loaders=loaders, debug=engine.debug,
+                  libraries=engine.libraries)
+
+
+def render_baseline(engine):
+    def render(posts, layout):
+        prefetch_variants(posts)
+        return [engine.render_to_string(
+            CARD_TEMPLATE, {'post': post, 'layout': layout}
+        ) for post in posts]
+    return render
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время рендера страницы карточек постов '
+            'без кэша карточек, текущим способом и прежним')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200,
+                            help='Сколько раз рендерить каждую страницу')
+        parser.add_argument('--page-size', type=int, default=10,
+                            help='Сколько карточек на странице')
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.select_related('author', 'group')[
+            :options['page_size']
+        ])
+        if not posts:
+            raise CommandError('Нет постов: сначала выполните seed')
+        renderers = (
+            ('прежний', render_baseline(baseline_engine())),
+            ('текущий', render_uncached),
+        )
+        header = ''.join(f'{f"p{rank}, мс":>10}' for rank in PERCENTILES)
+        self.stdout.write(f'{"вёрстка":<10}{"рендер":<10}{header}')
+        for layout in LAYOUTS:
+            for name, render in renderers:
+                # Первый рендер прогревает загрузчик шаблонов
+                # и метаданные картинок.
+                render(posts, layout)
+                timings = []
+                for _ in range(options['rounds']):
+                    start = time.perf_counter()
+                    render(posts, layout)
+                    timings.append(time.perf_counter() - start)
+                line = ''.join(f'{percentile(timings, rank) * 1000:>10.2f}'
+                               for rank in PERCENTILES)
+                self.stdout.write(f'{layout:<10}{name:<10}{line}')
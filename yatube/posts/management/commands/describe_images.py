@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import counters
+from posts.cache import bump_generation
+from posts.lists import OBJECTS_GENERATION
+from posts.models import Post
+from posts.uploads import COLOR_SAMPLE_SIZE, EMPTY_DESCRIPTION, describe
+from yatube.settings import COUNTERS_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, цвет и заглушку картинок постов, '
+            'загруженных до появления этих полей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько постов обрабатывать за один проход'
+        )
+
+    def describe(self, storage, name):
+        try:
+            with storage.open(name) as content, Image.open(content) as image:
+                width, height = image.size
+                # Заглушке и цвету хватает JPEG, декодированного
+                # в уменьшенном масштабе.
+                image.draft('RGB', COLOR_SAMPLE_SIZE)
+                description = describe(image)
+        except OSError:
+            return None
+        description.update(image_width=width, image_height=height)
+        return description
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        described, missing = 0, 0
+        for batch in counters.iter_batches(Post, options['batch_size']):
+            posts = list(Post.objects.filter(
+                pk__in=batch, image_width__isnull=True
+            ).exclude(image='').only('pk', 'image'))
+            descriptions = {}
+            for post in posts:
+                name = post.image.name
+                if name not in descriptions:
+                    descriptions[name] = self.describe(storage, name)
+                description = descriptions[name]
+                if description is None:
+                    missing += 1
+                    continue
+                for field, value in description.items():
+                    setattr(post, field, value)
+                described += 1
+            Post.objects.bulk_update(
+                [post for post in posts if descriptions[post.image.name]],
+                list(EMPTY_DESCRIPTION)
+            )
+        bump_generation('site', 'feed', 'cards', OBJECTS_GENERATION)
+        self.stdout.write(
+            f'Описано картинок: {described}, не найдено: {missing}'
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.cache import bump_generation
+from posts.lists import OBJECTS_GENERATION
+from posts.models import Group, MediaFile, Post, User
+from yatube.settings import COUNTERS_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько строк пересчитывать за один проход'
+        )
+
+    def handle(self, *args, **options):
+        steps = (
+            (User, counters.recount_users),
+            (Group, counters.recount_groups),
+            (Post, counters.recount_posts),
+        )
+        for model, recount in steps:
+            total = 0
+            for batch in counters.iter_batches(model, options['batch_size']):
+                recount(batch)
+                total += len(batch)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: пересчитано {total}'
+            )
+        counters.recount_files()
+        # Счётчики исправлены в обход сигналов: закэшированные страницы
+        # и объекты показывали бы прежние значения.
+        bump_generation('site', 'feed', 'cards', OBJECTS_GENERATION)
+        self.stdout.write(
+            f'{MediaFile._meta.verbose_name_plural}: пересчитано '
+            f'{MediaFile.objects.count()}'
+        )
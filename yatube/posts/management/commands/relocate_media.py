@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.cache import bump_generation
+from posts.lists import OBJECTS_GENERATION
+from posts.models import Post
+from posts.storage import content_digest
+from yatube.settings import COUNTERS_BATCH_SIZE, THUMBNAIL_WORKERS
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с именами '
+            'по хешу содержимого')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=max(THUMBNAIL_WORKERS, 1),
+            help='Сколько потоков копируют файлы'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько постов обрабатывать за один проход'
+        )
+
+    def relocate(self, name):
+        if not self.storage.exists(name):
+            return name, None
+        with self.storage.open(name) as content:
+            return name, self.storage.save(name, content)
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        relocated, missing = {}, set()
+        with ThreadPoolExecutor(max_workers=options['workers'],
+                                thread_name_prefix='media') as executor:
+            for batch in counters.iter_batches(Post, options['batch_size']):
+                posts = [
+                    (pk, name) for pk, name in Post.objects.filter(
+                        pk__in=batch
+                    ).exclude(image='').values_list('pk', 'image')
+                    if content_digest(name) is None
+                ]
+                pending = {name for _, name in posts} - relocated.keys()
+                for old, new in executor.map(self.relocate, pending - missing):
+                    if new is None:
+                        missing.add(old)
+                    else:
+                        relocated[old] = new
+                Post.objects.bulk_update(
+                    [Post(pk=pk, image=relocated[name])
+                     for pk, name in posts if name in relocated],
+                    ('image',)
+                )
+        # Старые файлы удаляются, только когда на них не ссылается
+        # ни один пост.
+        for old in relocated:
+            self.storage.delete(old)
+        counters.recount_files()
+        bump_generation('site', 'feed', 'cards', OBJECTS_GENERATION)
+        self.stdout.write(
+            f'Перенесено файлов: {len(relocated)}, '
+            f'не найдено: {len(missing)}'
+        )
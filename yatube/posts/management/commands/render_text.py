@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.cache import bump_generation
+from posts.lists import OBJECTS_GENERATION
+from posts.models import Comment, Post
+from posts.text import render_text
+from yatube.settings import COUNTERS_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Заполняет HTML и отрывки текстов постов и комментариев, '
+            'сохранённых до появления этих полей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько строк обрабатывать за один проход'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все строки, а не только пустые'
+        )
+
+    def render(self, model, fields, options):
+        rendered = 0
+        for batch in counters.iter_batches(model, options['batch_size']):
+            objects = model.objects.filter(pk__in=batch)
+            if not options['all']:
+                objects = objects.filter(text_html='')
+            objects = list(objects.only('pk', 'text'))
+            for instance in objects:
+                render_text(instance)
+            model.objects.bulk_update(objects, fields)
+            rendered += len(objects)
+        return rendered
+
+    def handle(self, *args, **options):
+        posts = self.render(Post, ('text_html', 'excerpt'), options)
+        comments = self.render(Comment, ('text_html',), options)
+        bump_generation('site', 'feed', 'cards', OBJECTS_GENERATION)
+        self.stdout.write(
+            f'Обработано постов: {posts}, комментариев: {comments}'
+        )
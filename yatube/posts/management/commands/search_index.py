@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие индексы и триггеры полнотекстового поиска '
+            'и перестраивает индексы')
+
+    def handle(self, *args, **options):
+        search.install()
+        self.stdout.write('Поисковые индексы перестроены')
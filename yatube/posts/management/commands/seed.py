@@ -0,0 +1,162 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faker import Faker
+
+from posts import feed
+from posts.cache import bump_generation
+from posts.lists import IDS_GENERATION
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.settings import FEED_BACKFILL_SIZE
+
+SEED_PASSWORD = 'yatube-seed'
+SEED_PERIOD = timedelta(days=365 * 3)
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу большим объёмом тестовых данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--follows', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Зерно генератора для воспроизводимости')
+        parser.add_argument('--no-feeds', action='store_true',
+                            help='Не заполнять ленты подписок')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = timezone.now()
+
+        user_ids = self.seed_users(options['users'])
+        group_ids = self.seed_groups(options['groups'])
+        post_ids = self.seed_posts(options['posts'], user_ids, group_ids)
+        self.seed_comments(options['comments'], user_ids, post_ids)
+        self.seed_follows(options['follows'], user_ids)
+        # bulk_create не вызывает сигналы: счётчики и HTML текстов
+        # пересчитываются разом, а ленты заполняются уже по готовым
+        # счётчикам подписчиков.
+        call_command('recount', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        call_command('render_text', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        feed.mark_pull_authors()
+        if not options['no_feeds']:
+            self.seed_feeds()
+        bump_generation(IDS_GENERATION)
+
+    def random_date(self):
+        return self.now - SEED_PERIOD * self.random.random()
+
+    def insert(self, model, total, build, **kwargs):
+        """Создаёт total объектов пачками и возвращает их первичные ключи."""
+        last_pk = (model.objects.order_by('-pk')
+                   .values_list('pk', flat=True).first() or 0)
+        for start in range(0, total, self.batch_size):
+            count = min(self.batch_size, total - start)
+            model.objects.bulk_create(
+                [build(start + i) for i in range(count)], **kwargs
+            )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {start + count}/{total}',
+                ending='\r'
+            )
+        self.stdout.write('')
+        return list(
+            model.objects.filter(pk__gt=last_pk)
+            .values_list('pk', flat=True)
+        )
+
+    def seed_users(self, total):
+        password = make_password(SEED_PASSWORD)
+        prefix = self.fake.unique.pystr(min_chars=6, max_chars=6).lower()
+        return self.insert(User, total, lambda i: User(
+            username=f'{prefix}_{i}',
+            first_name=self.fake.first_name(),
+            last_name=self.fake.last_name(),
+            email=f'{prefix}_{i}@example.com',
+            password=password,
+        ))
+
+    def seed_groups(self, total):
+        prefix = self.fake.unique.pystr(min_chars=6, max_chars=6).lower()
+        return self.insert(Group, total, lambda i: Group(
+            title=self.fake.sentence(nb_words=3)[:200],
+            slug=f'{prefix}-{i}',
+            description=self.fake.paragraph(),
+        ))
+
+    def seed_posts(self, total, user_ids, group_ids):
+        with manual_dates(Post._meta.get_field('pub_date')):
+            return self.insert(Post, total, lambda i: Post(
+                text=self.fake.paragraph(nb_sentences=5),
+                pub_date=self.random_date(),
+                author_id=self.random.choice(user_ids),
+                group_id=(self.random.choice(group_ids)
+                          if group_ids and self.random.random() < 0.7
+                          else None),
+            ))
+
+    def seed_comments(self, total, user_ids, post_ids):
+        if not post_ids:
+            return
+        with manual_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, total, lambda i: Comment(
+                text=self.fake.sentence(),
+                created=self.random_date(),
+                author_id=self.random.choice(user_ids),
+                post_id=self.random.choice(post_ids),
+            ))
+
+    def seed_follows(self, total, user_ids):
+        if len(user_ids) < 2:
+            return
+
+        def build(i):
+            user_id, author_id = self.random.sample(user_ids, 2)
+            return Follow(user_id=user_id, author_id=author_id)
+
+        self.insert(Follow, total, build, ignore_conflicts=True)
+
+    def seed_feeds(self):
+        """Раскладывает по лентам последние посты авторов, как при
+        подписке; авторы с огромным числом подписчиков читаются при запросе.
+        """
+        authors = Follow.objects.order_by().values_list(
+            'author', flat=True
+        ).distinct()
+        for author_id in authors.iterator():
+            if feed.is_pull_author(author_id):
+                continue
+            followers = Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user', flat=True)
+            feed.backfill(followers.iterator(), author_id)
+        self.stdout.write(
+            f'Ленты подписок заполнены (до {FEED_BACKFILL_SIZE} '
+            f'постов на автора)'
+        )
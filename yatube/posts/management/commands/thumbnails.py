@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_many
+from yatube.settings import COUNTERS_BATCH_SIZE, THUMBNAIL_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Заранее создаёт миниатюры для картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=max(THUMBNAIL_WORKERS, 1),
+            help='Сколько потоков создают миниатюры'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=COUNTERS_BATCH_SIZE,
+            help='Сколько картинок обрабатывать за один проход'
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by().values_list(
+            'image', 'image_width', 'image_height'
+        ).distinct()
+        batch, total, failed = [], 0, 0
+        for name, width, height in images.iterator():
+            batch.append((name, (width, height)))
+            if len(batch) == options['batch_size']:
+                failed += generate_many(batch, options['workers'])
+                total += len(batch)
+                batch = []
+        if batch:
+            failed += generate_many(batch, options['workers'])
+            total += len(batch)
+        self.stdout.write(
+            f'Миниатюр создано: {total - failed}, с ошибками: {failed}'
+        )
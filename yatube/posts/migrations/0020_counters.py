@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def _count_by(queryset, field):
+    return dict(
+        queryset.order_by().values_list(field).annotate(Count('pk'))
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    posts = _count_by(Post.objects.all(), 'author')
+    followers = _count_by(Follow.objects.all(), 'author')
+    following = _count_by(Follow.objects.all(), 'user')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id,
+                   posts_count=posts.get(user_id, 0),
+                   followers_count=followers.get(user_id, 0),
+                   following_count=following.get(user_id, 0))
+         for user_id in User.objects.values_list('pk', flat=True)),
+        batch_size=1000
+    )
+    for group_id, count in _count_by(Post.objects.all(), 'group').items():
+        Group.objects.filter(pk=group_id).update(posts_count=count)
+    for post_id, count in _count_by(Comment.objects.all(), 'post').items():
+        Post.objects.filter(pk=post_id).update(comments_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0019_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:42
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_references(apps, schema_editor):
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    references = Post.objects.exclude(image='').order_by().values_list(
+        'image'
+    ).annotate(Count('pk'))
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=count)
+         for name, count in references),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Схема зафиксирована здесь, а не берётся из posts.search: правка модуля
+# не должна менять того, что делает уже применённая миграция.
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+
+def index_sql(index, table):
+    delete = (f"INSERT INTO {index}({index}, rowid, text) "
+              f"VALUES ('delete', old.id, old.text);")
+    insert = f'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"text, content='{table}', content_rowid='id', "
+        f"tokenize='{TOKENIZER}')",
+        f'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT '
+        f'ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE '
+        f'ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF text '
+        f'ON {table} BEGIN {delete} {insert} END',
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(index):
+    return [f'DROP TRIGGER IF EXISTS {index}_{name}'
+            for name in ('insert', 'delete', 'update')] + [
+        f'DROP TABLE IF EXISTS {index}'
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_rendered_text'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            index_sql('posts_post_fts', 'posts_post')
+            + index_sql('posts_comment_fts', 'posts_comment'),
+            drop_sql('posts_post_fts') + drop_sql('posts_comment_fts'),
+        ),
+    ]
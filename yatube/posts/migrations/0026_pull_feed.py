@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pull_authors(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(pull_feed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pull_feed',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются в ленты при запросе'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -8,6 +10,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название')
     slug = models.SlugField(max_length=400, unique=True)
     description = models.TextField(verbose_name='Описание')
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -19,10 +26,24 @@ class Group(models.Model):
 
 class Post(models.Model):
     TEXT_SLICE_CUT = 15
+    EXCERPT_LENGTH = 200
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста'
     )
+    # HTML и отрывок считаются при сохранении, чтобы шаблоны
+    # не прогоняли текст через linebreaks на каждом рендере.
+    text_html = models.TextField(
+        verbose_name='Текст поста в HTML',
+        blank=True,
+        editable=False
+    )
+    excerpt = models.CharField(
+        verbose_name='Отрывок',
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
         auto_now_add=True
@@ -43,14 +64,53 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Описание картинки заполняется при загрузке, чтобы шаблоны
+    # не открывали файл ради размеров и заглушки.
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_color = models.CharField(
+        verbose_name='Основной цвет картинки',
+        max_length=7,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        verbose_name='Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
-        ordering = ('-pub_date', 'text')
+        ordering = ('-pub_date', '-id')
         default_related_name = 'posts'
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:self.TEXT_SLICE_CUT]
@@ -70,12 +130,22 @@ class Comment(models.Model):
         help_text='Автор, комментария',
     )
     text = models.TextField()
+    text_html = models.TextField(
+        verbose_name='Текст комментария в HTML',
+        blank=True,
+        editable=False
+    )
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        ordering = ('created', 'id')
         default_related_name = 'comments'
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:Post.TEXT_SLICE_CUT]
@@ -107,3 +177,97 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Пользователь: {self.user}, подписался на {self.author}'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_item'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'Лента {self.user}: {self.post}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Количество подписок',
+        default=0
+    )
+    pull_feed = models.BooleanField(
+        verbose_name='Посты читаются в ленты при запросе',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'Статистика {self.user}'
+
+
+class MediaFile(models.Model):
+    """Число постов, ссылающихся на файл в ContentAddressedStorage."""
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=255,
+        primary_key=True
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Количество ссылок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.signing import Signer
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+from .thumbnails import get_formats
+
+SPEC = re.compile(r'^(?P<width>\d+)x(?P<height>\d+)\.(?P<extension>\w+)$')
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png',
+                 'WEBP': 'image/webp'}
+
+signer = Signer(salt='posts.resize')
+_slots = threading.BoundedSemaphore(settings.IMAGE_RESIZE_CONCURRENCY)
+
+
+class ResizeBusy(Exception):
+    pass
+
+
+def sign(image_name, spec):
+    # Подпись привязана к имени файла: после замены картинки старые
+    # адреса перестают работать, и их можно кэшировать навсегда.
+    return signer.signature(f'{image_name}/{spec}')
+
+
+def check_signature(image_name, spec, signature):
+    return constant_time_compare(sign(image_name, spec), signature)
+
+
+def image_url(post, spec):
+    """Подписанный адрес варианта картинки поста, например 480x200.webp."""
+    return reverse('posts:post_image', kwargs={
+        'post_id': post.pk,
+        'signature': sign(post.image.name, spec),
+        'spec': spec,
+    })
+
+
+def parse_spec(spec):
+    """(ширина, высота, формат) или None, если спецификация недопустима."""
+    match = SPEC.match(spec)
+    if match is None:
+        return None
+    width, height = int(match['width']), int(match['height'])
+    image_format = FORMATS.get(match['extension'])
+    limit = settings.POST_IMAGE_MAX_SIDE
+    if (image_format not in get_formats()
+            or not 0 < width <= limit or not 0 < height <= limit):
+        return None
+    return width, height, image_format
+
+
+def cache_path(image_name, spec):
+    key = hashlib.sha256(f'{image_name}/{spec}'.encode()).hexdigest()
+    return os.path.join(settings.IMAGE_CACHE_ROOT, key[:2], key[2:4],
+                        f'{key}{os.path.splitext(spec)[1]}')
+
+
+def get_resized(image, spec, size):
+    """Путь к варианту в дисковом кэше; создаёт его при первом запросе.
+
+    Одновременно создаётся не больше IMAGE_RESIZE_CONCURRENCY вариантов;
+    если свободного места не дождались, вызывается ResizeBusy.
+    """
+    path = cache_path(image.name, spec)
+    if os.path.exists(path):
+        return path
+    if not _slots.acquire(timeout=settings.IMAGE_RESIZE_TIMEOUT):
+        raise ResizeBusy(spec)
+    try:
+        # Пока ждали, вариант мог создать другой поток.
+        if not os.path.exists(path):
+            _write(image, size, path)
+    finally:
+        _slots.release()
+    return path
+
+
+def _write(image, size, path):
+    width, height, image_format = size
+    with image.storage.open(image.name) as content, \
+            Image.open(content) as source:
+        source.draft('RGB', (width, height))
+        resized = ImageOps.fit(ImageOps.exif_transpose(source),
+                               (width, height))
+    if image_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+        resized = resized.convert('RGB')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Пишем во временный файл и переименовываем: читатели никогда
+    # не увидят файл наполовину.
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            resized.save(output, image_format,
+                         **settings.POST_IMAGE_SAVE_OPTIONS.get(
+                             image_format, {}))
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
@@ -0,0 +1,160 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индексы — FTS5-таблицы с внешним содержимым: текст хранится только
+в posts_post и posts_comment, а триггеры обновляют индекс при любых
+изменениях, включая bulk_create и QuerySet.update.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.expressions import RawSQL
+
+from yatube.settings import SEARCH_COMMENT_WEIGHT, SEARCH_MAX_TERMS
+from .models import Comment, Post
+from .utils import KeysetPaginator
+
+TOKEN = re.compile(r'\w+')
+INDEXES = {
+    Post: 'posts_post_fts',
+    Comment: 'posts_comment_fts',
+}
+TOKENIZER = 'unicode61 remove_diacritics 2'
+TRIGGERS = ('insert', 'delete', 'update')
+
+
+def index_sql(model):
+    """Таблица FTS5 и триггеры, поддерживающие её в актуальном виде."""
+    index, table = INDEXES[model], model._meta.db_table
+    delete = (f"INSERT INTO {index}({index}, rowid, text) "
+              f"VALUES ('delete', old.id, old.text);")
+    insert = f'INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"text, content='{table}', content_rowid='id', "
+        f"tokenize='{TOKENIZER}')",
+        f'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT '
+        f'ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE '
+        f'ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF text '
+        f'ON {table} BEGIN {delete} {insert} END',
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(model):
+    index = INDEXES[model]
+    return [f'DROP TRIGGER IF EXISTS {index}_{name}'
+            for name in TRIGGERS] + [
+        f'DROP TABLE IF EXISTS {index}'
+    ]
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """Создаёт индексы и триггеры, если их нет, и перестраивает индексы."""
+    with connections[using].cursor() as cursor:
+        for model in INDEXES:
+            for sql in index_sql(model):
+                cursor.execute(sql)
+
+
+def missing_triggers(using=DEFAULT_DB_ALIAS):
+    """Триггеры, которых нет у существующих индексов.
+
+    Миграции SQLite, пересоздающие таблицу постов или комментариев,
+    молча удаляют её триггеры, и индекс перестаёт обновляться.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+        )
+        existing = {name for name, in cursor.fetchall()}
+    return [f'{index}_{trigger}' for index in INDEXES.values()
+            if index in existing for trigger in TRIGGERS
+            if f'{index}_{trigger}' not in existing]
+
+
+def to_match(query):
+    """Выражение MATCH из пользовательского запроса или None.
+
+    Слова берутся в кавычки, чтобы синтаксис FTS5 в запросе не ломал
+    поиск; последнее слово ищется по префиксу.
+    """
+    terms = TOKEN.findall(query.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def matching(model, match):
+    """Подзапрос с id объектов, текст которых подходит под выражение
+    из to_match.
+    """
+    index = INDEXES[model]
+    return RawSQL(f'SELECT rowid FROM {index} WHERE {index} MATCH %s',
+                  (match,))
+
+
+class SearchPaginator(KeysetPaginator):
+    """Курсорный вывод результатов поиска по релевантности.
+
+    Позиция — пара (оценка, id поста): оценка bm25 тем меньше, чем
+    лучше совпадение, а совпадения в комментариях весят
+    SEARCH_COMMENT_WEIGHT от совпадений в тексте поста.
+    """
+
+    def __init__(self, query, per_page):
+        self.match = to_match(query)
+        super().__init__(Post.objects.select_related('author', 'group'),
+                         per_page, descending=False)
+
+    def key(self, obj):
+        return obj.search_score, obj.pk
+
+    def dump_key(self, obj):
+        return list(self.key(obj))
+
+    def load_key(self, value):
+        score, pk = value
+        if (not isinstance(score, (int, float)) or isinstance(score, bool)
+                or not isinstance(pk, int)):
+            return None
+        return float(score), pk
+
+    def fetch(self, position, backwards, limit):
+        if self.match is None:
+            return []
+        params = [self.match, SEARCH_COMMENT_WEIGHT, self.match]
+        having = ''
+        if position is not None:
+            sign = '<' if backwards else '>'
+            having = (f'HAVING MIN(hit_score) {sign} %s '
+                      f'OR (MIN(hit_score) = %s AND post_id {sign} %s)')
+            params += [position[0], position[0], position[1]]
+        order = 'DESC' if backwards else 'ASC'
+        sql = f'''
+            WITH hits(post_id, hit_score) AS (
+                SELECT rowid, bm25(posts_post_fts) FROM posts_post_fts
+                WHERE posts_post_fts MATCH %s
+                UNION ALL
+                SELECT comment.post_id, bm25(posts_comment_fts) * %s
+                FROM posts_comment_fts
+                JOIN posts_comment AS comment
+                    ON comment.id = posts_comment_fts.rowid
+                WHERE posts_comment_fts MATCH %s
+            )
+            SELECT post_id, MIN(hit_score) AS score FROM hits
+            GROUP BY post_id {having}
+            ORDER BY score {order}, post_id {order}
+            LIMIT %s
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            scores = cursor.fetchall()
+        posts = self.object_list.in_bulk([pk for pk, _ in scores])
+        found = []
+        for pk, score in scores:
+            if pk in posts:
+                posts[pk].search_score = score
+                found.append(posts[pk])
+        return found
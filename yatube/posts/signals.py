@@ -0,0 +1,288 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import autocomplete, counters, feed, lists, search
+from .cache import bump_generation, forget
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .text import render_text
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые Django сохраняет у пользователя при входе и смене пароля:
+# на отображение постов они не влияют.
+USER_SERVICE_FIELDS = frozenset(('last_login', 'password'))
+
+
+@receiver(post_migrate)
+def refresh_cached_objects(sender, app_config, plan=None, **kwargs):
+    # Кэш переживает перезапуск сервера: после миграций posts в нём могли
+    # остаться посты старой схемы. Остальной кэш не трогаем.
+    if app_config.name == 'posts' and any(
+        migration.app_label == 'posts' for migration, _ in plan or ()
+    ):
+        bump_generation(lists.OBJECTS_GENERATION, lists.IDS_GENERATION,
+                        'site', 'feed', 'cards')
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, app_config, using, **kwargs):
+    # Миграция, пересоздающая таблицу постов или комментариев, удаляет
+    # триггеры поиска; без них индекс устаревал бы без ошибок.
+    if app_config.name != 'posts':
+        return
+    missing = search.missing_triggers(using)
+    if missing:
+        logger.warning('Нет триггеров поиска %s, индексы перестраиваются',
+                       ', '.join(missing))
+        search.install(using)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def render_saved_text(sender, instance, **kwargs):
+    render_text(instance)
+
+
+# Прежние значения полей, которые нужны обработчикам post_save: поле ->
+# атрибут экземпляра и значение для нового объекта.
+SAVED_FIELDS = {
+    Post: {'group': ('_saved_group_id', None), 'image': ('_saved_image', '')},
+    Group: {'slug': ('_saved_slug', None)},
+    User: {'username': ('_saved_username', None)},
+}
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Group)
+@receiver(pre_save, sender=User)
+def remember_saved_fields(sender, instance, update_fields=None, **kwargs):
+    if (sender is User and update_fields
+            and USER_SERVICE_FIELDS.issuperset(update_fields)):
+        return
+    fields = SAVED_FIELDS[sender]
+    saved = [default for _, default in fields.values()]
+    if not instance._state.adding:
+        saved = sender.objects.filter(pk=instance.pk).values_list(
+            *fields
+        ).first() or saved
+    for (attribute, _), value in zip(fields.values(), saved):
+        setattr(instance, attribute, value)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+    elif instance._saved_group_id != instance.group_id:
+        counters.bump_group(instance._saved_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def reference_image(sender, instance, **kwargs):
+    if instance._saved_image == instance.image.name:
+        return
+    counters.acquire_file(instance.image.name)
+    release_image(instance._saved_image, instance.image.storage)
+
+
+@receiver(post_delete, sender=Post)
+def dereference_image(sender, instance, **kwargs):
+    release_image(instance.image.name, instance.image.storage)
+
+
+def release_image(name, storage):
+    # Один файл может принадлежать нескольким постам: удаляем его только
+    # вместе с последней ссылкой.
+    if counters.release_file(name):
+        transaction.on_commit(lambda: delete_file(name, storage))
+
+
+def delete_file(name, storage):
+    try:
+        storage.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить файл %s', name)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_viewer(sender, instance, **kwargs):
+    bump_generation(f'viewer:{instance.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+    elif instance._saved_group_id != instance.group_id:
+        if instance._saved_group_id is not None:
+            lists.remove_post(instance,
+                              [f'group:{instance._saved_group_id}'])
+        if instance.group_id is not None:
+            lists.add_post(instance, [f'group:{instance.group_id}'])
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_feeds(sender, instance, **kwargs):
+    feed.on_delete(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_post_object(sender, instance, **kwargs):
+    lists.forget_objects(Post, [instance.pk])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_group_object(sender, instance, **kwargs):
+    lists.forget_objects(Group, [instance.pk])
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # Посты удалённой группы получат group_id = NULL запросом UPDATE
+    # без сигналов, поэтому их id нужно запомнить заранее.
+    instance._post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_posts(sender, instance, **kwargs):
+    lists.forget_objects(Post, instance._post_ids)
+
+
+@receiver(post_delete, sender=User)
+def forget_user_object(sender, instance, **kwargs):
+    lists.forget_objects(User, [instance.pk])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.on_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    feed.on_unfollow(instance)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_card(sender, instance, created, **kwargs):
+    if not created:
+        bump_generation(f'post-card:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    forget('post-author', instance.pk)
+    names = ['feed', f'post:{instance.pk}', f'author:{instance.author_id}']
+    for group_id in {instance.group_id,
+                     getattr(instance, '_saved_group_id', None)}:
+        if group_id is not None:
+            names.append(f'group:{group_id}')
+    bump_generation(*names)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    forget('group', instance.slug)
+    # Прежний slug закэширован без срока и вёл бы на эту группу.
+    if getattr(instance, '_saved_slug', None) not in (None, instance.slug):
+        forget('group', instance._saved_slug)
+    bump_generation('feed', 'site', f'group:{instance.pk}',
+                    f'group-cards:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    if update_fields and USER_SERVICE_FIELDS.issuperset(update_fields):
+        return
+    forget('user', instance.username)
+    if instance._saved_username not in (None, instance.username):
+        forget('user', instance._saved_username)
+    lists.forget_objects(User, [instance.pk])
+    if created:
+        bump_generation(f'author:{instance.pk}')
+    else:
+        bump_generation('feed', 'site', f'author:{instance.pk}',
+                        f'author-cards:{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def forget_author(sender, instance, **kwargs):
+    forget('user', instance.username)
+    bump_generation(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    bump_generation(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields, **kwargs):
+    if update_fields and USER_SERVICE_FIELDS.issuperset(update_fields):
+        return
+    autocomplete.update_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    autocomplete.remove('user', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, **kwargs):
+    autocomplete.update_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(sender, instance, **kwargs):
+    autocomplete.remove('group', instance.pk)
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(
+    r'/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})[^/]*$'
+)
+
+
+def content_digest(name):
+    """Хеш содержимого из имени файла ContentAddressedStorage или None."""
+    match = HASHED_NAME.search(name)
+    return match.group('digest') if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из хеша содержимого в дереве каталогов
+    вида posts/ab/cd/abcd….jpg. Одинаковые файлы записываются один раз;
+    удалять их можно только когда на файл не осталось ссылок
+    (см. counters.release_file).
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        key = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return f'{directory}/{key[:2]}/{key[2:4]}/{key}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
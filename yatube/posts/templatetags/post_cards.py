@@ -0,0 +1,11 @@
+from django import template
+
+from posts.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, layout):
+    """Карточки постов страницы из кэша; layout — feed, group или profile."""
+    return render_cards(posts, layout)
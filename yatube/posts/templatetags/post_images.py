@@ -0,0 +1,62 @@
+import logging
+
+from django import template
+from django.conf import settings
+
+from posts.resize import image_url
+from posts.thumbnails import (FALLBACK_FORMAT, get_base_size, get_variants,
+                              image_size, variant_height)
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+POST_IMAGE_TEMPLATE = 'posts/includes/post_image.html'
+
+
+def _srcset(variants):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for thumbnail, width in variants)
+
+
+@register.inclusion_tag(POST_IMAGE_TEMPLATE)
+def post_image(post, css_class='card-img my-2'):
+    """Картинка поста в нескольких ширинах и форматах через <picture>.
+
+    Размеры, цвет и размытая заглушка берутся из полей поста, поэтому
+    файл не открывается, а до загрузки картинки место под неё уже занято.
+    Вариантов шире исходной картинки нет.
+    """
+    image = post.image
+    if not image:
+        return {}
+    try:
+        variants = get_variants(image, image_size(post))
+    except Exception:
+        # Как и тег thumbnail, не роняем страницу из-за одной картинки.
+        logger.exception('Не удалось получить варианты %s', image)
+        return {}
+    fallback = variants.pop(FALLBACK_FORMAT)
+    base_width, _ = get_base_size()
+    src, width = next(
+        (variant for variant in fallback if variant[1] == base_width),
+        fallback[-1]
+    )
+    return {
+        'sources': [(f'image/{image_format.lower()}', _srcset(items))
+                    for image_format, items in variants.items()],
+        'src': src.url,
+        'srcset': _srcset(fallback),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': width,
+        'height': variant_height(width),
+        'color': post.image_color,
+        'placeholder': post.image_placeholder,
+        'css_class': css_class,
+    }
+
+
+@register.simple_tag
+def post_image_url(post, spec):
+    """Адрес варианта картинки поста по спецификации вида 480x200.webp."""
+    return image_url(post, spec) if post.image else ''
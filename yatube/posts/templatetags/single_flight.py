@@ -0,0 +1,47 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.cache import single_flight
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        return single_flight(
+            key, self.version.resolve(context),
+            lambda: self.nodelist.render(context),
+            self.timeout.resolve(context)
+        )
+
+
+@register.tag
+def single_flight_cache(parser, token):
+    """Как {% cache %}, но версия записи передаётся отдельно и сменяется
+    через single_flight: фрагмент пересобирает один запрос, остальные
+    получают прежний.
+
+        {% single_flight_cache timeout name var1 var2 version=generation %}
+    """
+    nodelist = parser.parse(('endsingle_flight_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 4 or not tokens[-1].startswith('version='):
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} ожидает время, имя фрагмента и version=...'
+        )
+    return SingleFlightCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:-1]],
+        parser.compile_filter(tokens[-1][len('version='):])
+    )
@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.db import connection, transaction
+from django.urls import reverse
+
+from posts.autocomplete import Autocomplete, autocomplete
+from posts.cache import bump_generation
+from posts.models import Group, User
+from .test_config import BaseTestCase
+
+SUGGEST_REVERSE = reverse('posts:suggest')
+
+
+class AutocompleteTest(BaseTestCase):
+    def suggest(self, query):
+        response = self.guest_client.get(SUGGEST_REVERSE, {'q': query})
+        return [item['value'] for item in response.json()['results']]
+
+    def commit(self):
+        """Вызывает обработчики on_commit, как при фиксации транзакции:
+        TestCase свою транзакцию не фиксирует.
+        """
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+
+    def test_prefix_matches_names_and_groups(self):
+        """Подсказки ищутся по началу логина, любого слова полного имени
+        и названия группы без учёта регистра.
+        """
+        User.objects.create_user(username='ivan', first_name='Иван',
+                                 last_name='Петров')
+        self.assertEqual(self.suggest('test_a'), ['test_author'])
+        self.assertEqual(self.suggest('ПЕТ'), ['ivan'])
+        self.assertEqual(self.suggest('иван п'), ['ivan'])
+        self.assertEqual(self.suggest('first'), ['first-group'])
+        self.assertEqual(self.suggest('gro'), ['first-group', 'Left-group'])
+        self.assertEqual(self.suggest(' '), [])
+
+    def test_warm_index_skips_database(self):
+        """Подсказки из построенного индекса не обращаются к базе."""
+        self.suggest('t')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('test_f'), ['test_follower'])
+
+    def test_signals_update_index_incrementally(self):
+        """Изменения пользователей и групп попадают в индекс после
+        фиксации транзакции без перестроения, а при неполном журнале
+        изменений индекс перестраивается.
+        """
+        self.suggest('t')
+        with mock.patch.object(autocomplete, 'build',
+                               wraps=autocomplete.build) as build:
+            group = Group.objects.get(pk=self.first_group.pk)
+            group.title = 'Renamed'
+            group.save()
+            User.objects.create_user(username='newcomer')
+            self.assertEqual(self.suggest('renam'), [])
+            self.commit()
+            self.assertEqual(self.suggest('renam'), ['first-group'])
+            self.assertEqual(self.suggest('first'), [])
+            self.assertEqual(self.suggest('newc'), ['newcomer'])
+            User.objects.get(username='newcomer').delete()
+            self.commit()
+            self.assertEqual(self.suggest('newc'), [])
+            build.assert_not_called()
+            bump_generation('autocomplete')
+            self.suggest('t')
+            build.assert_called_once()
+
+    def test_other_process_applies_changes_without_database(self):
+        """Другой процесс получает изменения из кэша, не читая базу."""
+        other = Autocomplete()
+        other.search('t', 10)
+        User.objects.create_user(username='newcomer')
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [item['value'] for item in other.search('newc', 10)],
+                ['newcomer']
+            )
+
+    def test_rolled_back_changes_are_not_suggested(self):
+        """Изменения из отменённой транзакции в подсказки не попадают."""
+        self.suggest('t')
+        try:
+            with transaction.atomic():
+                User.objects.create_user(username='ghost')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.commit()
+        self.assertEqual(self.suggest('ghost'), [])
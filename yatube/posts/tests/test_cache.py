@@ -0,0 +1,295 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from posts import cards
+from posts.cache import (LOCK_KEY, LOOKUP_KEY, get_generation,
+                         response_key, single_flight)
+from posts.signals import refresh_cached_objects
+from posts.models import Comment, Group, Post, User
+from posts.text import render_html
+from .test_config import AMOUNT_OF_POSTS, BaseTestCase, INDEX_REVERSE
+
+
+class AnonymousCacheTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        """Повторный запрос анонима обходится без запросов к базе."""
+        routes = (
+            INDEX_REVERSE,
+            self.FIRST_GROUP_REVERSE,
+            self.PROFILE_REVERSE,
+            self.POST_DETAIL_REVERSE,
+        )
+        for route in routes:
+            with self.subTest(route=route):
+                content = self.guest_client.get(route).content
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(route)
+                self.assertEqual(response.content, content)
+
+    def test_comment_evicts_only_its_post(self):
+        """Новый комментарий сбрасывает страницу поста,
+        но не страницу группы.
+        """
+        self.guest_client.get(self.POST_DETAIL_REVERSE)
+        self.guest_client.get(self.FIRST_GROUP_REVERSE)
+        Comment.objects.create(
+            post=self.posts, author=self.follower, text='Fresh comment'
+        )
+        self.assertContains(
+            self.guest_client.get(self.POST_DETAIL_REVERSE), 'Fresh comment'
+        )
+        with self.assertNumQueries(0):
+            self.guest_client.get(self.FIRST_GROUP_REVERSE)
+
+    def test_post_edit_evicts_group_page(self):
+        """Изменение поста сбрасывает страницу его группы."""
+        self.guest_client.get(self.FIRST_GROUP_REVERSE)
+        post = Post.objects.get(pk=self.posts.pk)
+        post.text = 'Edited text'
+        post.save()
+        self.assertContains(
+            self.guest_client.get(self.FIRST_GROUP_REVERSE), 'Edited text'
+        )
+
+    def test_renamed_slug_and_username_are_forgotten(self):
+        """После смены slug группы и имени пользователя прежние значения
+        не остаются в кэше соответствий и не ведут на эти объекты.
+        """
+        self.guest_client.get(self.FIRST_GROUP_REVERSE)
+        self.guest_client.get(self.PROFILE_REVERSE)
+        old_keys = [LOOKUP_KEY.format('group', self.first_group.slug),
+                    LOOKUP_KEY.format('user', self.author.username)]
+        self.assertEqual(len(cache.get_many(old_keys)), 2)
+        group = Group.objects.get(pk=self.first_group.pk)
+        group.slug = 'renamed-group'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed_author'
+        author.save()
+        self.assertEqual(cache.get_many(old_keys), {})
+
+    def test_authorized_pages_are_not_cached(self):
+        """Ответы авторизованным пользователям не кэшируются целиком."""
+        self.authors_client.get(self.POST_DETAIL_REVERSE)
+        Post.objects.filter(pk=self.posts.pk).update(
+            text='Not signalled', text_html=render_html('Not signalled')
+        )
+        self.assertContains(
+            self.authors_client.get(self.POST_DETAIL_REVERSE), 'Not signalled'
+        )
+
+    def test_stale_page_is_served_during_rebuild(self):
+        """Пока другой процесс пересобирает страницу после изменений,
+        аноним получает прежнюю версию.
+        """
+        self.guest_client.get(INDEX_REVERSE)
+        Post.objects.create(author=self.author, text='Rebuilding')
+        cache.add(LOCK_KEY.format(response_key(INDEX_REVERSE)), True)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(INDEX_REVERSE)
+        self.assertNotContains(response, 'Rebuilding')
+        cache.delete(LOCK_KEY.format(response_key(INDEX_REVERSE)))
+        self.assertContains(self.guest_client.get(INDEX_REVERSE),
+                            'Rebuilding')
+
+
+class MigrationCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def migrate(self, *app_labels):
+        plan = [(mock.Mock(app_label=label), False) for label in app_labels]
+        refresh_cached_objects(sender=None, plan=plan,
+                               app_config=apps.get_app_config('posts'))
+
+    def test_only_posts_migrations_refresh_objects(self):
+        """Кэш не очищается: сбрасываются только поколения постов
+        и только после миграций posts.
+        """
+        cache.set('unrelated', 'kept')
+        before = get_generation('objects')
+        self.migrate()
+        self.migrate('auth')
+        self.assertEqual(get_generation('objects'), before)
+        self.migrate('posts')
+        self.assertNotEqual(get_generation('objects'), before)
+        self.assertEqual(cache.get('unrelated'), 'kept')
+
+
+class SingleFlightTest(SimpleTestCase):
+    KEY = 'single-flight-test'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.compute = mock.Mock(return_value='new')
+
+    def lock(self):
+        cache.add(LOCK_KEY.format(self.KEY), True)
+
+    def test_value_is_computed_once(self):
+        for _ in range(3):
+            self.assertEqual(single_flight(self.KEY, 1, self.compute, 60),
+                             'new')
+        self.compute.assert_called_once()
+        self.assertIsNone(cache.get(LOCK_KEY.format(self.KEY)))
+
+    def test_stale_value_is_served_while_locked(self):
+        single_flight(self.KEY, 1, lambda: 'old', 60)
+        self.lock()
+        self.assertEqual(single_flight(self.KEY, 2, self.compute, 60), 'old')
+        self.compute.assert_not_called()
+
+    def test_missing_value_waits_for_leader(self):
+        """Без прежнего значения запрос ждёт результат другого процесса,
+        а не дождавшись, считает сам.
+        """
+        self.lock()
+
+        def leader_finishes(seconds):
+            cache.set(self.KEY, (1, 'leader', float('inf'), 0))
+        with mock.patch('posts.cache.time.sleep', leader_finishes):
+            self.assertEqual(single_flight(self.KEY, 1, self.compute, 60),
+                             'leader')
+        self.compute.assert_not_called()
+        cache.delete(self.KEY)
+        with mock.patch('posts.cache.STAMPEDE_WAIT', 0):
+            self.assertEqual(single_flight(self.KEY, 1, self.compute, 60),
+                             'new')
+
+    def test_slow_values_are_recomputed_early(self):
+        """Чем дольше расчёт, тем раньше срока запись пересчитывается."""
+        cache.set(self.KEY, (1, 'old', time.time() + 10, 1.0))
+        with mock.patch('posts.cache.random.random', return_value=0):
+            self.assertEqual(single_flight(self.KEY, 1, self.compute, 60),
+                             'old')
+        with mock.patch('posts.cache.random.random',
+                        return_value=1 - 1e-9):
+            self.assertEqual(single_flight(self.KEY, 1, self.compute, 60),
+                             'new')
+
+
+class ConditionalGetTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Страница без изменений отдаёт 304 по сохранённому ETag."""
+        routes = (
+            INDEX_REVERSE,
+            self.FIRST_GROUP_REVERSE,
+            self.PROFILE_REVERSE,
+            self.POST_DETAIL_REVERSE,
+        )
+        for client in (self.guest_client, self.followers_client):
+            for route in routes:
+                with self.subTest(route=route):
+                    # Первый ответ может выставить cookie с CSRF-токеном,
+                    # который входит в ETag.
+                    client.get(route)
+                    etag = client.get(route)['ETag']
+                    response = client.get(route, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code,
+                                     HTTPStatus.NOT_MODIFIED)
+
+    def test_not_modified_skips_database(self):
+        """Проверка ETag обходится без запросов к базе."""
+        etag = self.guest_client.get(self.POST_DETAIL_REVERSE)['ETag']
+        with self.assertNumQueries(0):
+            self.guest_client.get(self.POST_DETAIL_REVERSE,
+                                  HTTP_IF_NONE_MATCH=etag)
+
+    def test_changes_refresh_etag(self):
+        """Комментарий и подписка меняют ETag затронутых страниц."""
+        etag = self.guest_client.get(self.POST_DETAIL_REVERSE)['ETag']
+        Comment.objects.create(
+            post=self.posts, author=self.follower, text='Fresh comment'
+        )
+        response = self.guest_client.get(self.POST_DETAIL_REVERSE,
+                                         HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        etag = self.followers_client.get(self.PROFILE_REVERSE)['ETag']
+        self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
+        response = self.followers_client.get(self.PROFILE_REVERSE,
+                                             HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['following'])
+
+
+class PostCardCacheTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.content = self.authors_client.get(self.PROFILE_REVERSE).content
+
+    def rendered_cards(self):
+        """Сколько карточек пришлось отрендерить при открытии профиля."""
+        with mock.patch('posts.cards.render_uncached',
+                        wraps=cards.render_uncached) as render:
+            response = self.authors_client.get(self.PROFILE_REVERSE)
+        rendered = sum(len(call.args[0]) for call in render.call_args_list)
+        return rendered, response
+
+    def test_cards_are_served_from_cache(self):
+        """Повторная страница собирается из готовых карточек."""
+        with mock.patch('posts.cards.cache.get_many',
+                        wraps=cards.cache.get_many) as get_many:
+            rendered, response = self.rendered_cards()
+        self.assertEqual(rendered, 0)
+        self.assertEqual(response.content, self.content)
+        card_fetches = [call for call in get_many.call_args_list
+                        if any(key.startswith('card:')
+                               for key in call.args[0])]
+        self.assertEqual(len(card_fetches), 1)
+
+    def test_card_without_loaded_group(self):
+        """Карточка поста, чья группа удалена, но осталась в group_id,
+        рендерится без ссылки на группу.
+        """
+        post = Post.objects.select_related('author').get(pk=self.posts.pk)
+        post.group = None
+        post.group_id = self.first_group.pk
+        card, = cards.render_uncached([post], 'feed')
+        self.assertNotIn('Все записи группы', card)
+
+    def test_changes_evict_only_affected_cards(self):
+        """Правка поста и переименование группы сбрасывают только свои
+        карточки, а смена имени автора — все его карточки.
+        """
+        post = Post.objects.get(pk=self.posts.pk)
+        post.text = 'Edited card'
+        post.save()
+        rendered, response = self.rendered_cards()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Edited card')
+
+        group = Group.objects.get(pk=self.first_group.pk)
+        group.title = 'Renamed group'
+        group.save()
+        rendered, response = self.rendered_cards()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Renamed group')
+
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Card'
+        author.last_name = 'Author'
+        author.save()
+        rendered, response = self.rendered_cards()
+        self.assertEqual(rendered, AMOUNT_OF_POSTS)
+        self.assertContains(response, 'Card Author')
+
+    def test_cards_match_page_layout(self):
+        """Карточка содержит ссылки на автора, группу и пост."""
+        response = self.authors_client.get(self.FIRST_GROUP_REVERSE)
+        self.assertContains(response, self.PROFILE_REVERSE)
+        self.assertContains(response, self.POST_DETAIL_REVERSE)
+        self.assertContains(self.authors_client.get(INDEX_REVERSE),
+                            self.FIRST_GROUP_REVERSE)
@@ -0,0 +1,148 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import urls
+from posts.cards import render_uncached
+from posts.management.commands.benchmark_cards import (baseline_engine,
+                                                       render_baseline)
+from posts.models import (Comment, FeedItem, Follow, Group, Post, User,
+                          UserStats)
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_creates_consistent_data(self):
+        """Команда seed создаёт данные пачками и приводит счётчики
+        и ленты подписок в соответствие с ними.
+        """
+        call_command('seed', users=5, groups=2, posts=30, comments=20,
+                     follows=6, batch_size=7, seed=1, stdout=StringIO())
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 1
+        )
+        for stats in UserStats.objects.all():
+            self.assertEqual(stats.posts_count,
+                             Post.objects.filter(author=stats.user).count())
+        self.assertFalse(Post.objects.filter(text_html='').exists())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            FeedItem.objects.filter(user=follow.user,
+                                    author=follow.author).count(),
+            Post.objects.filter(author=follow.author).count()
+        )
+
+
+class RenderTextCommandTest(TestCase):
+    def test_render_text_fills_rows_created_in_bulk(self):
+        """render_text заполняет HTML постов и комментариев,
+        созданных в обход сигналов.
+        """
+        author = User.objects.create_user(username='bulk_author')
+        Post.objects.bulk_create(
+            [Post(author=author, text='Пост\nиз пачки')]
+        )
+        post = Post.objects.get(author=author)
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=author, text='a < b')]
+        )
+        call_command('render_text', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>Пост<br>из пачки</p>')
+        self.assertEqual(post.excerpt, 'Пост из пачки')
+        self.assertEqual(Comment.objects.get().text_html, '<p>a &lt; b</p>')
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_benchmark_reports_every_url(self):
+        """Команда benchmark выводит строку для каждого адреса posts."""
+        call_command('seed', users=3, groups=1, posts=5, comments=5,
+                     follows=0, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark', requests=2, cold=True, stdout=out)
+        for pattern in urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(pattern.name, out.getvalue())
+
+    def test_benchmark_leaves_data_unchanged(self):
+        """Подписка в benchmark откатывается сразу, а не отменяется
+        следующей отпиской: прерванный замер не оставляет подписок.
+        """
+        call_command('seed', users=3, groups=1, posts=5, comments=5,
+                     follows=0, seed=1, stdout=StringIO())
+        stats = list(UserStats.objects.order_by('pk').values_list(
+            'followers_count', 'following_count'
+        ))
+        # benchmark подписывается на автора первого поста.
+        unfollow = reverse('posts:profile_unfollow',
+                           args=(Post.objects.first().author.username,))
+        get = Client.get
+
+        def interrupted_get(client, path, *args, **kwargs):
+            if path == unfollow:
+                raise KeyboardInterrupt
+            return get(client, path, *args, **kwargs)
+
+        with mock.patch.object(Client, 'get', interrupted_get), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('benchmark', requests=1, stdout=StringIO())
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(list(UserStats.objects.order_by('pk').values_list(
+            'followers_count', 'following_count'
+        )), stats)
+
+    def test_benchmark_cards_reports_every_layout(self):
+        """Команда benchmark_cards выводит строку для каждой вёрстки."""
+        call_command('seed', users=3, groups=1, posts=5, comments=0,
+                     follows=0, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_cards', rounds=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        for layout in ('feed', 'group', 'profile'):
+            for renderer in ('прежний', 'текущий'):
+                with self.subTest(layout=layout, renderer=renderer):
+                    self.assertTrue(any(
+                        line.split()[:2] == [layout, renderer]
+                        for line in lines
+                    ))
+
+    def test_baseline_cards_match_current_cards(self):
+        """Прежний рендер в benchmark_cards выдаёт те же карточки, что
+        и текущий, с точностью до пробелов.
+        """
+        call_command('seed', users=3, groups=1, posts=5, comments=0,
+                     follows=0, seed=1, stdout=StringIO())
+        posts = list(Post.objects.select_related('author', 'group'))
+        render = render_baseline(baseline_engine())
+        for layout in ('feed', 'group', 'profile'):
+            with self.subTest(layout=layout):
+                self.assertEqual(
+                    [' '.join(re.sub(r'>\s+', '>', card).split())
+                     for card in render(posts, layout)],
+                    [' '.join(re.sub(r'>\s+', '>', card).split())
+                     for card in render_uncached(posts, layout)]
+                )
+
+
+class ThumbnailsCommandTest(TestCase):
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_thumbnails_generated_for_every_image(self, get_thumbnail):
+        """Команда thumbnails создаёт по миниатюре на каждую картинку."""
+        call_command('seed', users=2, groups=0, posts=3, comments=0,
+                     follows=0, seed=1, stdout=StringIO())
+        Post.objects.update(image='posts/seeded.jpg')
+        Post.objects.filter(pk=Post.objects.first().pk).update(image='')
+        out = StringIO()
+        call_command('thumbnails', workers=2, batch_size=1, stdout=out)
+        self.assertEqual(
+            {call[0][0] for call in get_thumbnail.call_args_list},
+            {'posts/seeded.jpg'}
+        )
+        self.assertIn('Миниатюр создано: 1', out.getvalue())
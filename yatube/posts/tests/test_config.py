@@ -1,7 +1,9 @@
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.models import Comment, Group, Post, User
+from posts.text import render_text
 from yatube.settings import AMOUNT_OF_POSTS
 
 POSTS_RANGE = 14
@@ -18,6 +20,7 @@ FOLLOW_URL = '/follow/'
 FOLLOW_REVERSE = reverse('posts:follow_index')
 
 
+@override_settings(QUERY_BUDGET_ENFORCE=True, THUMBNAIL_WORKERS=0)
 class BaseTestCase(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -34,13 +37,15 @@ class BaseTestCase(TestCase):
             slug='Left-group',
             description='Contains posts with left IDs'
         )
-        cls.posts_left_group = Post.objects.bulk_create(
-            [Post(
-                text=f'Test text of Post №{i}',
-                author=cls.author,
-                group=cls.left_group
-            ) for i in range(1, POSTS_RANGE)]
-        )
+        posts_left_group = [Post(
+            text=f'Test text of Post №{i}',
+            author=cls.author,
+            group=cls.left_group
+        ) for i in range(1, POSTS_RANGE)]
+        # bulk_create не вызывает pre_save, HTML текста заполняем сами.
+        for post in posts_left_group:
+            render_text(post)
+        cls.posts_left_group = Post.objects.bulk_create(posts_left_group)
         cls.posts = Post.objects.create(
             text='First Group Post',
             author=cls.author,
@@ -88,3 +93,9 @@ class BaseTestCase(TestCase):
         cls.GUEST_COMMENT_REDIRECT_TO_LOGIN_URL = (
             f'/auth/login/?next={cls.COMMENT_URL}'
         )
+
+    def tearDown(self):
+        # База откатывается после каждого теста, а кэш нет: карточки
+        # и поколения из одного теста не должны попадать в другой.
+        cache.clear()
+        super().tearDown()
@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from .test_config import POSTS_RANGE, BaseTestCase
+
+
+class CountersTest(BaseTestCase):
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters_follow_writes(self):
+        """Создание, перенос в другую группу и удаление поста
+        обновляют счётчики автора и групп.
+        """
+        posts_before = self.stats(self.author).posts_count
+        post = Post.objects.create(
+            text='Counted', author=self.author, group=self.first_group
+        )
+        self.assertEqual(self.stats(self.author).posts_count,
+                         posts_before + 1)
+        self.assertEqual(Group.objects.get(pk=self.first_group.pk)
+                         .posts_count, 2)
+        post.group = self.left_group
+        post.save()
+        self.assertEqual(Group.objects.get(pk=self.first_group.pk)
+                         .posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, posts_before)
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки обновляют свои счётчики."""
+        comment = Comment.objects.create(
+            post=self.posts, author=self.follower, text='Counted'
+        )
+        self.assertEqual(Post.objects.get(pk=self.posts.pk).comments_count,
+                         2)
+        comment.delete()
+        self.assertEqual(Post.objects.get(pk=self.posts.pk).comments_count,
+                         1)
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.follower).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+
+    def test_author_with_content_can_be_deleted(self):
+        """Удаление автора с постами, комментариями и подписками
+        не восстанавливает его статистику и обновляет счётчики остальных.
+        """
+        author = User.objects.create_user(username='leaving_author')
+        post = Post.objects.create(text='Leaving', author=author)
+        Comment.objects.create(post=post, author=author, text='Own')
+        Comment.objects.create(post=self.posts, author=author, text='Other')
+        Follow.objects.create(user=author, author=self.author)
+        Follow.objects.create(user=self.follower, author=author)
+        author.delete()
+        self.assertFalse(User.objects.filter(pk=author.pk).exists())
+        self.assertFalse(UserStats.objects.filter(user_id=author.pk).exists())
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+        self.assertEqual(Post.objects.get(pk=self.posts.pk).comments_count,
+                         1)
+
+    def test_recount_repairs_counters(self):
+        """Команда recount исправляет счётчики после bulk_create."""
+        call_command('recount', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, POSTS_RANGE)
+        self.assertEqual(
+            Group.objects.get(pk=self.left_group.pk).posts_count,
+            POSTS_RANGE - 1
+        )
+        response = self.guest_client.get(self.PROFILE_REVERSE)
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         POSTS_RANGE)
+
+    def test_recount_refreshes_cached_pages(self):
+        """После recount закэшированные страницы показывают исправленные
+        счётчики.
+        """
+        UserStats.objects.filter(user=self.author).update(posts_count=99)
+        self.assertContains(self.guest_client.get(self.PROFILE_REVERSE),
+                            'Всего постов: 99')
+        call_command('recount', stdout=StringIO())
+        self.assertContains(self.guest_client.get(self.PROFILE_REVERSE),
+                            f'Всего постов: {POSTS_RANGE}')
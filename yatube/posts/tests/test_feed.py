@@ -0,0 +1,85 @@
+from unittest import mock
+
+from posts.models import FeedItem, Follow, Post, User, UserStats
+from .test_config import AMOUNT_OF_POSTS, BaseTestCase, FOLLOW_REVERSE
+
+
+class FeedTest(BaseTestCase):
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Fan out', author=self.author)
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.follower, post=post).exists()
+        )
+        response = self.followers_client.get(FOLLOW_REVERSE)
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_follow_backfills_and_unfollow_trims_feed(self):
+        """Подписка заполняет ленту старыми постами, отписка очищает."""
+        self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.follower).count(),
+            self.author.posts.count()
+        )
+        self.followers_client.get(self.PROFILE_UNFOLLOW_REVERSE)
+        self.assertFalse(
+            FeedItem.objects.filter(user=self.follower).exists()
+        )
+
+    def test_feed_pages_follow_cursor(self):
+        """Лента подписок листается курсором без повторов."""
+        self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
+        first_page = self.followers_client.get(
+            FOLLOW_REVERSE).context['page_obj']
+        self.assertEqual(len(first_page), AMOUNT_OF_POSTS)
+        second_page = self.followers_client.get(
+            FOLLOW_REVERSE + f'?page={first_page.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(self.author.posts.order_by('-pub_date', '-pk'))
+        )
+
+    @mock.patch('posts.feed.FEED_FANOUT_LIMIT', 0)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты автора с множеством подписчиков не раскладываются
+        по лентам, а подмешиваются при чтении.
+        """
+        self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
+        post = Post.objects.create(text='Pulled', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        response = self.followers_client.get(FOLLOW_REVERSE)
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    @mock.patch('posts.feed.FEED_FANOUT_LIMIT', 2)
+    @mock.patch('posts.feed.FEED_PUSH_LIMIT', 1)
+    def test_fanout_mode_switches_with_hysteresis(self):
+        """Автор переходит на чтение при запросе выше верхнего порога
+        и возвращается к раскладке только у нижнего; подписки около
+        верхнего порога ленты не заполняют.
+        """
+        def is_pull():
+            return UserStats.objects.get(user=self.author).pull_feed
+
+        readers = [self.follower] + [
+            User.objects.create_user(username=f'reader_{number}')
+            for number in range(2)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        self.assertTrue(is_pull())
+        self.assertFalse(FeedItem.objects.filter(user=readers[-1]).exists())
+
+        Follow.objects.filter(user=readers[-1]).delete()
+        Follow.objects.create(user=readers[-1], author=self.author)
+        self.assertTrue(is_pull())
+        self.assertFalse(FeedItem.objects.filter(user=readers[-1]).exists())
+
+        post = Post.objects.create(text='Pulled', author=self.author)
+        for reader in readers[1:]:
+            Follow.objects.get(user=reader).delete()
+        self.assertFalse(is_pull())
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.follower, post=post).exists()
+        )
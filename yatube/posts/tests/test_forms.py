@@ -1,12 +1,18 @@
+import re
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
 
 from posts.models import Comment, Post
+from posts.thumbnails import get_formats
 from .test_config import CREATE_REVERSE, BaseTestCase
 
 SMALL_JPG = (
@@ -27,8 +33,8 @@ UPLOADED_EDIT = SimpleUploadedFile(
     content=SMALL_JPG,
     content_type='image/jpg'
 )
-PATH_TO_IMAGE = f'posts/{UPLOADED.name}'
-PATH_TO_IMAGE_EDIT = f'posts/{UPLOADED_EDIT.name}'
+HASHED_IMAGE_NAME = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
+EXIF_DESCRIPTION_TAG = 0x010E
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
@@ -79,7 +85,7 @@ class PostFormTests(BaseTestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.pk, form_data['group'])
         self.assertEqual(post.author, self.author)
-        self.assertEqual(post.image, PATH_TO_IMAGE)
+        self.assertRegex(post.image.name, HASHED_IMAGE_NAME)
 
     def test_post_form_edit_post(self):
         """Валидная форма редактирует пост"""
@@ -101,7 +107,123 @@ class PostFormTests(BaseTestCase):
         self.assertEqual(post.text, form_data_edit['text'])
         self.assertEqual(post.group.id, form_data_edit['group'])
         self.assertEqual(post.author, self.author)
-        self.assertEqual(post.image, PATH_TO_IMAGE_EDIT)
+        self.assertRegex(post.image.name, HASHED_IMAGE_NAME)
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_thumbnail_generated_after_upload(self, get_thumbnail):
+        """Варианты картинки создаются сразу после сохранения новой
+        картинки и не пересоздаются при правке без картинки.
+        """
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': 'Thumbnail',
+            'image': SimpleUploadedFile('thumb.jpg', SMALL_JPG, 'image/jpg')
+        })
+        # Картинка 2x1 меньше всех вариантов, поэтому создаётся только
+        # наименьший.
+        variants = len(get_formats())
+        self.assertEqual(get_thumbnail.call_count, variants)
+        image = Post.objects.get(text='Thumbnail').image.name
+        for call in get_thumbnail.call_args_list:
+            self.assertEqual(call[0][0], image)
+        self.authors_client.post(self.POST_EDIT_REVERSE, data={
+            'text': 'Edited without image'
+        })
+        self.assertEqual(get_thumbnail.call_count, variants)
+
+    def test_post_image_srcset_uses_content_hash(self):
+        """Картинка выводится набором ширин, а имена вариантов зависят
+        от содержимого файла, а не от его имени.
+        """
+        for name in ('first.jpg', 'second.jpg'):
+            self.authors_client.post(CREATE_REVERSE, data={
+                'text': name,
+                'image': SimpleUploadedFile(name, SMALL_JPG, 'image/jpg')
+            })
+        pages = [
+            self.guest_client.get(reverse(
+                'posts:post_detail', args=(Post.objects.get(text=name).pk,)
+            )).content.decode()
+            for name in ('first.jpg', 'second.jpg')
+        ]
+        srcsets = [re.search(r'<img src="[^"]+" srcset="([^"]+)"', page)
+                   .group(1) for page in pages]
+        self.assertIn('<picture>', pages[0])
+        self.assertIn(f' {settings.POST_IMAGE_WIDTHS[0]}w', srcsets[0])
+        self.assertEqual(srcsets[0], srcsets[1])
+
+    def test_srcset_limited_by_stored_size(self):
+        """Варианты шире сохранённых размеров картинки не выводятся,
+        а размеры img берутся у основного варианта.
+        """
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': 'Wide', 'image': self.make_jpeg('wide.jpg', (1000, 500))
+        })
+        post = Post.objects.get(text='Wide')
+        content = self.guest_client.get(reverse(
+            'posts:post_detail', args=(post.pk,)
+        )).content.decode()
+        srcset = re.search(r'<img src="[^"]+" srcset="([^"]+)"',
+                           content).group(1)
+        self.assertIn(' 480w', srcset)
+        self.assertIn(' 960w', srcset)
+        self.assertNotIn(' 1440w', srcset)
+        self.assertIn('width="960" height="399"', content)
+
+    def make_jpeg(self, name, size):
+        exif = Image.Exif()
+        exif[EXIF_DESCRIPTION_TAG] = 'Secret location'
+        content = BytesIO()
+        Image.new('RGB', size, 'red').save(content, 'JPEG',
+                                           exif=exif.tobytes())
+        return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploaded_image_is_downscaled_without_exif(self):
+        """Загруженная картинка уменьшается и теряет EXIF."""
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': 'Master', 'image': self.make_jpeg('big.jpg', (400, 200))
+        })
+        post = Post.objects.get(text='Master')
+        self.assertRegex(post.image.name, HASHED_IMAGE_NAME)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn(EXIF_DESCRIPTION_TAG, image.getexif())
+
+    def test_image_description_rendered_without_files(self):
+        """При загрузке запоминаются размеры, цвет и заглушка картинки,
+        и страница выводит их, не открывая файл.
+        """
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': 'Described', 'image': self.make_jpeg('red.jpg', (40, 20))
+        })
+        post = Post.objects.get(text='Described')
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertRegex(post.image_color, r'^#f[0-9a-f]0[0-9a-f]0[0-9a-f]$')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        with mock.patch('PIL.Image.open') as image_open:
+            content = self.guest_client.get(reverse(
+                'posts:post_detail', args=(post.pk,)
+            )).content.decode()
+        image_open.assert_not_called()
+        self.assertIn('width="480" height="200" loading="lazy"', content)
+        self.assertIn(post.image_placeholder, content)
+
+    def test_oversized_images_are_rejected(self):
+        """Слишком тяжёлые или слишком большие картинки не принимаются."""
+        limits = (
+            {'POST_IMAGE_MAX_BYTES': 10},
+            {'POST_IMAGE_MAX_PIXELS': 100},
+        )
+        for limit in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                response = self.authors_client.post(CREATE_REVERSE, data={
+                    'text': 'Rejected',
+                    'image': self.make_jpeg('huge.jpg', (50, 50))
+                })
+                self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.filter(text='Rejected').exists())
 
 
 class CommentFormTest(BaseTestCase):
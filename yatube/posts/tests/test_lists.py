@@ -0,0 +1,192 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from posts import lists
+from posts.feed import FeedPaginator
+from posts.lists import IDS_KEY, RELATED_KEYS, CachedKeysetPaginator
+from posts.models import Follow, Group, Post, User
+from posts.utils import KeysetPaginator
+from .test_config import BaseTestCase
+
+PER_PAGE = 5
+
+
+class FeedIdsCacheTest(BaseTestCase):
+    def paginator(self, feed='index', queryset=None):
+        if queryset is None:
+            queryset = Post.objects.select_related('author', 'group')
+        return CachedKeysetPaginator(queryset, PER_PAGE, feed)
+
+    def cached_ids(self, feed='index'):
+        return [pk for _, pk in cache.get(IDS_KEY.format(feed))[1][1]]
+
+    def test_warm_pages_skip_database(self):
+        """Страницы внутри окна собираются из кэша без запросов."""
+        first = self.paginator().get_page(None)
+        with self.assertNumQueries(0):
+            page = self.paginator().get_page(None)
+            second = self.paginator().get_page(page.next_cursor)
+            authors = [post.author.username for post in second]
+        self.assertEqual(list(page), list(first))
+        self.assertEqual(authors, [self.author.username] * PER_PAGE)
+
+    @mock.patch('posts.lists.MAX_ROWS', 6)
+    def test_pages_match_uncached_feed(self):
+        """Вперёд и назад от последней страницы, в окне и за ним,
+        страницы совпадают с обычной курсорной пагинацией.
+        """
+        uncached = KeysetPaginator(Post.objects.all(), PER_PAGE)
+        cursors = [(None, None)]
+        while cursors[-1][0] != '':
+            cursor = cursors[-1][1]
+            page = self.paginator().get_page(cursor)
+            expected = uncached.get_page(cursor)
+            self.assertEqual(list(page), list(expected))
+            self.assertEqual(page.next_cursor, expected.next_cursor)
+            self.assertEqual(page.previous_cursor, expected.previous_cursor)
+            cursors.append((page.next_cursor or '', page.next_cursor))
+        cursor = uncached.last_cursor
+        while cursor:
+            page = self.paginator().get_page(cursor)
+            expected = uncached.get_page(cursor)
+            self.assertEqual(list(page), list(expected))
+            self.assertEqual(page.previous_cursor, expected.previous_cursor)
+            cursor = page.previous_cursor
+
+    def test_new_post_updates_lists_in_place(self):
+        """Новый пост дописывается в закэшированные списки, а правка
+        группы переносит его между списками групп.
+        """
+        group_feed = f'group:{self.first_group.pk}'
+        self.paginator().get_page(None)
+        self.paginator(group_feed, self.first_group.posts.all()).get_page(
+            None
+        )
+        post = Post.objects.create(author=self.author, text='Fresh',
+                                   group=self.left_group)
+        with mock.patch.object(CachedKeysetPaginator, 'window') as window:
+            self.assertEqual(self.paginator().get_page(None)[0], post)
+        window.assert_not_called()
+        post.group = self.first_group
+        post.save()
+        self.assertEqual(self.cached_ids(group_feed)[0], post.pk)
+        post.delete()
+        self.assertNotIn(post.pk, self.cached_ids())
+        self.assertNotIn(post.pk, self.cached_ids(group_feed))
+
+    def test_follow_feed_follows_subscriptions(self):
+        """Подписка сбрасывает список ленты читателя, новый пост автора
+        попадает в неё на месте.
+        """
+        def first_page():
+            return FeedPaginator(self.follower, PER_PAGE).get_page(None)
+
+        self.assertEqual(len(first_page()), 0)
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(len(first_page()), PER_PAGE)
+        post = Post.objects.create(author=self.author, text='For followers')
+        self.assertEqual(
+            self.cached_ids(f'follow:{self.follower.pk}')[0], post.pk
+        )
+        self.assertEqual(first_page()[0], post)
+
+    def test_changes_refresh_cached_objects(self):
+        """Правка поста, автора и группы видна в собранных страницах."""
+        self.paginator().get_page(None)
+        post = Post.objects.get(pk=self.posts.pk)
+        post.text = 'Edited'
+        post.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Renamed'
+        author.save()
+        group = Group.objects.get(pk=self.first_group.pk)
+        group.title = 'Retitled'
+        group.save()
+        first = self.paginator().get_page(None)[0]
+        self.assertEqual(first.text, 'Edited')
+        self.assertEqual(first.author.first_name, 'Renamed')
+        self.assertEqual(first.group.title, 'Retitled')
+
+    def test_group_delete_refreshes_its_posts(self):
+        """После удаления группы её посты в ленте остаются без группы."""
+        self.paginator().get_page(None)
+        Group.objects.get(pk=self.first_group.pk).delete()
+        post = next(post for post in self.paginator().get_page(None)
+                    if post.pk == self.posts.pk)
+        self.assertIsNone(post.group)
+        self.assertEqual(self.guest_client.get('/').status_code, 200)
+
+    def test_missing_cached_group_is_none(self):
+        """Пост в кэше со ссылкой на несуществующую группу собирается
+        без группы, а не падает.
+        """
+        self.paginator().get_page(None)
+        with mock.patch('posts.lists.Group.objects.in_bulk',
+                        return_value={}):
+            cache.delete(RELATED_KEYS[Group].format(self.first_group.pk))
+            post = next(post for post in self.paginator().get_page(None)
+                        if post.pk == self.posts.pk)
+        self.assertIsNone(post.group)
+
+
+class FeedIdsRaceTest(BaseTestCase):
+    """Одновременные построение и правки списка не теряют посты."""
+
+    def cached_ids(self):
+        return [pk for _, pk in cache.get(IDS_KEY.format('index'))[1][1]]
+
+    def new_post(self, pk):
+        return Post(pk=pk, author=self.author, pub_date=timezone.now())
+
+    def in_thread(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.start()
+        # Даём потоку дойти до блокировки.
+        time.sleep(0.1)
+        return thread
+
+    def test_post_added_while_list_is_built(self):
+        """Пост, сохранённый между запросом окна и записью списка,
+        попадает в список.
+        """
+        window = CachedKeysetPaginator.window
+        threads = []
+
+        def racing_window(paginator, limit):
+            posts = window(paginator, limit)
+            threads.append(self.in_thread(
+                lists.add_post, self.new_post(10 ** 6), ['index']
+            ))
+            return posts
+
+        with mock.patch.object(CachedKeysetPaginator, 'window',
+                               racing_window):
+            CachedKeysetPaginator(Post.objects.all(), PER_PAGE,
+                                  'index').get_page(None)
+        threads[0].join()
+        self.assertEqual(self.cached_ids()[0], 10 ** 6)
+
+    def test_concurrent_writers_keep_both_posts(self):
+        """Два одновременных add_post оба попадают в список."""
+        CachedKeysetPaginator(Post.objects.all(), PER_PAGE,
+                              'index').get_page(None)
+        first, second = self.new_post(10 ** 6), self.new_post(10 ** 6 + 1)
+        get_versioned = lists.get_versioned
+        threads = []
+
+        def racing_get_versioned(*args):
+            found = get_versioned(*args)
+            if not threads:
+                threads.append(self.in_thread(
+                    lists.add_post, second, ['index']
+                ))
+            return found
+
+        with mock.patch('posts.lists.get_versioned', racing_get_versioned):
+            lists.add_post(first, ['index'])
+            threads[0].join()
+        self.assertEqual(self.cached_ids()[:2], [second.pk, first.pk])
@@ -69,3 +69,19 @@ class PostModelTest(BaseTestCase):
                         model._meta.get_field(field).help_text,
                         expected_value
                     )
+
+    def test_text_rendered_on_save(self):
+        """HTML текста экранируется и делится на абзацы при сохранении,
+        а отрывок обрезается по слову.
+        """
+        post = Post.objects.create(
+            author=self.author,
+            text='<b>Первый</b> абзац\n\nвторой ' + 'слово ' * 100
+        )
+        self.assertTrue(post.text_html.startswith(
+            '<p>&lt;b&gt;Первый&lt;/b&gt; абзац</p>\n\n<p>второй'
+        ))
+        self.assertLessEqual(len(post.excerpt), Post.EXCERPT_LENGTH)
+        self.assertTrue(post.excerpt.startswith('<b>Первый</b> абзац второй'))
+        self.assertTrue(post.excerpt.endswith('…'))
+        self.assertEqual(self.comment.text_html, '<p>test_comment</p>')
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.lists import CachedIdsMixin
+from .test_config import BaseTestCase, FOLLOW_REVERSE, INDEX_REVERSE
+
+
+class QueryPlanTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
+
+    def get_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def check_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.followers_client.get(url)
+        for query in context.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            for step in self.get_plan(query['sql']):
+                with self.subTest(url=url, step=step, sql=query['sql']):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    self.assertFalse(
+                        step.startswith('SCAN') and 'INDEX' not in step
+                    )
+        return response, [query['sql'] for query in context.captured_queries]
+
+    # Страницы читаются запросами с поиском по ключу, а не из кэша
+    # списков id, иначе проверялся бы только запрос окна.
+    @mock.patch.object(CachedIdsMixin, 'fetch',
+                       lambda self, *args: self.fetch_uncached(*args))
+    def test_list_views_use_indexes(self):
+        """Запросы страниц со списками постов идут по индексам
+        без полного просмотра таблиц и сортировки во временном B-дереве.
+        """
+        routes = (
+            INDEX_REVERSE,
+            self.LEFT_GROUP_REVERSE,
+            self.PROFILE_REVERSE,
+            FOLLOW_REVERSE,
+        )
+        for route in routes:
+            response, _ = self.check_plans(route)
+            page_obj = response.context['page_obj']
+            cursors = (
+                page_obj.next_cursor,
+                page_obj.paginator.last_cursor,
+            )
+            for cursor in cursors:
+                cache.clear()
+                response, queries = self.check_plans(f'{route}?page={cursor}')
+                if cursor == cursors[0]:
+                    with self.subTest(route=route):
+                        self.assertTrue(
+                            any('"pub_date" <' in sql for sql in queries)
+                        )
+            page_obj = response.context['page_obj']
+            if page_obj.previous_cursor:
+                self.check_plans(f'{route}?page={page_obj.previous_cursor}')
+
+    def test_post_detail_uses_indexes(self):
+        """Пост и комментарии к нему выбираются по индексам."""
+        self.check_plans(self.POST_DETAIL_REVERSE)
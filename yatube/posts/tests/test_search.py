@@ -0,0 +1,102 @@
+from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.search import SearchPaginator, missing_triggers, to_match
+from posts.signals import restore_search_index
+from .test_config import AMOUNT_OF_POSTS, BaseTestCase
+
+SEARCH_REVERSE = reverse('posts:search')
+
+
+class SearchTest(BaseTestCase):
+    def search(self, query, cursor=None):
+        return SearchPaginator(query, AMOUNT_OF_POSTS).get_page(cursor)
+
+    def test_post_text_ranks_above_comment(self):
+        """Совпадение в тексте поста выше совпадения в комментарии,
+        регистр не важен.
+        """
+        in_comment = Post.objects.create(author=self.author, text='Обычный')
+        Comment.objects.create(post=in_comment, author=self.follower,
+                               text='Про Фотографию')
+        in_text = Post.objects.create(author=self.author,
+                                      text='Фотография заката')
+        self.assertEqual(list(self.search('фотографию')), [in_comment])
+        self.assertEqual(list(self.search('фотограф')),
+                         [in_text, in_comment])
+
+    def test_triggers_are_installed(self):
+        """После миграций у индексов есть все триггеры."""
+        self.assertEqual(missing_triggers(), [])
+
+    def test_migrate_restores_dropped_triggers(self):
+        """Триггеры, удалённые пересозданием таблицы, восстанавливаются
+        после migrate, а индекс догоняет пропущенные изменения.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        post = Post.objects.create(author=self.author, text='Пропущенный')
+        self.assertEqual(missing_triggers(), ['posts_post_fts_insert'])
+        restore_search_index(None, apps.get_app_config('posts'), 'default')
+        self.assertEqual(missing_triggers(), [])
+        self.assertEqual(list(self.search('пропущенный')), [post])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при update и delete в обход сигналов."""
+        Post.objects.filter(pk=self.posts.pk).update(text='Переписанный')
+        self.assertEqual(list(self.search('переписанный')), [self.posts])
+        self.assertEqual(len(self.search('First Group')), 0)
+        Post.objects.filter(pk=self.posts.pk).delete()
+        self.assertEqual(len(self.search('переписанный')), 0)
+
+    def test_results_are_cursor_paginated(self):
+        """Страницы результатов не пересекаются и листаются назад."""
+        first = self.search('test text')
+        self.assertEqual(len(first), AMOUNT_OF_POSTS)
+        second = self.search('test text', first.next_cursor)
+        self.assertEqual(len(first) + len(second),
+                         len(self.posts_left_group))
+        self.assertFalse(set(first) & set(second))
+        self.assertIsNone(second.next_cursor)
+        previous = self.search('test text', second.previous_cursor)
+        self.assertEqual(list(previous), list(first))
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе считаются обычными словами."""
+        self.assertEqual(to_match('"Post" OR -(1'), '"post" "or" "1"*')
+        self.assertIsNone(to_match('"*-'))
+        response = self.guest_client.get(SEARCH_REVERSE,
+                                         {'q': 'NEAR("text" AND'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты и ссылку на следующую
+        страницу с тем же запросом.
+        """
+        response = self.guest_client.get(SEARCH_REVERSE, {'q': 'Test'})
+        self.assertContains(response, 'Test text of Post')
+        self.assertContains(response, '?q=Test&amp;page=')
+        self.assertIsNone(
+            self.guest_client.get(SEARCH_REVERSE).context['page_obj']
+        )
+
+
+class AdminSearchTest(BaseTestCase):
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу, а не через LIKE."""
+        self.author.is_staff = self.author.is_superuser = True
+        self.author.save()
+        routes = {
+            reverse('admin:posts_post_changelist'): 'First Group Post',
+            reverse('admin:posts_comment_changelist'): 'test_comment',
+        }
+        for route, text in routes.items():
+            with self.subTest(route=route):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authors_client.get(route, {'q': text})
+                self.assertEqual(response.context['cl'].result_count, 1)
+                self.assertFalse(any('LIKE' in query['sql']
+                                     for query in queries))
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import MediaFile, Post
+from .test_config import CREATE_REVERSE, BaseTestCase
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_png(color):
+    content = BytesIO()
+    Image.new('RGB', (4, 4), color).save(content, 'PNG')
+    return content.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.signals.transaction.on_commit', lambda callback: callback())
+class ContentAddressedStorageTest(BaseTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, text, name, content):
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': text,
+            'image': SimpleUploadedFile(name, content, 'image/png')
+        })
+        return Post.objects.get(text=text)
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом, который удаляется
+        вместе с последним ссылающимся на него постом.
+        """
+        content = make_png('red')
+        first = self.upload('First', 'meme.png', content)
+        second = self.upload('Second', 'copy.png', content)
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        first.delete()
+        self.assertTrue(second.image.storage.exists(name))
+        second.delete()
+        self.assertFalse(second.image.storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_released(self):
+        """Заменённая картинка поста удаляется из хранилища."""
+        post = self.upload('Replaced', 'old.png', make_png('red'))
+        old_name = post.image.name
+        self.authors_client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Replaced', 'image': SimpleUploadedFile(
+                'new.png', make_png('blue'), 'image/png'
+            )}
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+
+    def test_relocate_media_moves_flat_files(self):
+        """Команда relocate_media переносит старые файлы в дерево
+        каталогов по хешу и обновляет ссылки постов.
+        """
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'flat.png'),
+                  'wb') as image:
+            image.write(make_png('green'))
+        Post.objects.filter(pk=self.posts.pk).update(image='posts/flat.png')
+        call_command('relocate_media', workers=2, stdout=StringIO())
+        post = Post.objects.get(pk=self.posts.pk)
+        self.assertRegex(
+            post.image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$'
+        )
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertFalse(post.image.storage.exists('posts/flat.png'))
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1
+        )
+
+    def test_describe_images_fills_legacy_posts(self):
+        """Команда describe_images описывает картинки старых постов."""
+        name = self.posts.image.storage.save(
+            'posts/legacy.png', ContentFile(make_png('blue'))
+        )
+        Post.objects.filter(pk=self.posts.pk).update(image=name)
+        call_command('describe_images', stdout=StringIO())
+        post = Post.objects.get(pk=self.posts.pk)
+        self.assertEqual((post.image_width, post.image_height), (4, 4))
+        self.assertEqual(post.image_color, '#0000ff')
+        self.assertTrue(post.image_placeholder)
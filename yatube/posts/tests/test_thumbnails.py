@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.resize import image_url
+from posts import thumbnails
+from posts.thumbnails import TieredKVStore
+from .test_config import CREATE_REVERSE, INDEX_REVERSE, BaseTestCase
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+IMAGES = ('red', 'green', 'blue')
+
+
+def make_png(color, size=(8, 8)):
+    content = BytesIO()
+    Image.new('RGB', size, color).save(content, 'PNG')
+    return SimpleUploadedFile(f'{color}.png', content.getvalue(),
+                              'image/png')
+
+
+class TempMediaTestCase(BaseTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TieredKVStoreTest(TempMediaTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefetch_loads_keys_in_one_query(self):
+        """prefetch берёт найденное из общего кэша, а промахи — одним
+        запросом к базе и кладёт их в кэш.
+        """
+        store = TieredKVStore()
+        store._set_raw('stored', 'value')
+        cache.clear()
+        with self.assertNumQueries(1):
+            store.prefetch(['stored', 'missing'])
+        with self.assertNumQueries(0):
+            self.assertEqual(store._get_raw('stored'), 'value')
+            self.assertIsNone(store._get_raw('missing'))
+            store.prefetch(['stored', 'missing'])
+
+    def test_deleted_key_not_served_by_other_store(self):
+        """Удалённое одним экземпляром хранилища не отдаётся другим."""
+        reader, writer = TieredKVStore(), TieredKVStore()
+        writer._set_raw('thumbnail', 'value')
+        self.assertEqual(reader._get_raw('thumbnail'), 'value')
+        writer._delete_raw('thumbnail')
+        self.assertIsNone(reader._get_raw('thumbnail'))
+
+    def test_executor_created_once(self):
+        """Потоки, одновременно запросившие пул, получают один и тот же."""
+        start = threading.Barrier(4)
+        executors = []
+
+        def create(**kwargs):
+            # Создание пула медленное: остальные потоки успевают
+            # проверить, создан ли он.
+            time.sleep(0.05)
+            return mock.Mock()
+
+        def request():
+            start.wait()
+            executors.append(thumbnails.get_executor())
+
+        with mock.patch('posts.thumbnails._executor', None), \
+                mock.patch('posts.thumbnails.ThreadPoolExecutor',
+                           side_effect=create) as executor_class:
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(executor_class.call_count, 1)
+        self.assertEqual(len({id(executor) for executor in executors}), 1)
+
+    def test_page_thumbnails_are_prefetched(self):
+        """После перезапуска процесса метаданные миниатюр страницы
+        загружаются одним запросом, а не запросом на каждую картинку.
+        """
+        for color in IMAGES:
+            self.authors_client.post(CREATE_REVERSE, data={
+                'text': color, 'image': make_png(color)
+            })
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(INDEX_REVERSE)
+        kvstore_queries = [query for query in context.captured_queries
+                           if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(response.content.decode().count('<picture>'),
+                         len(IMAGES))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_CACHE_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'resized')
+)
+class ResizeEndpointTest(TempMediaTestCase):
+    def setUp(self):
+        self.authors_client.post(CREATE_REVERSE, data={
+            'text': 'Resized', 'image': make_png('red', (40, 40))
+        })
+        self.post = Post.objects.get(text='Resized')
+
+    def fetch(self, url):
+        response = self.guest_client.get(url)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+            response.close()
+            return response, content
+        return response, response.content
+
+    def test_variant_generated_once_and_cached(self):
+        """Вариант создаётся по подписанному адресу один раз и отдаётся
+        с заголовками долгого кэширования.
+        """
+        url = image_url(self.post, '20x10.jpg')
+        response, content = self.fetch(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(content)).size, (20, 10))
+        with mock.patch('posts.resize.Image.open') as image_open:
+            response, cached = self.fetch(url)
+        image_open.assert_not_called()
+        self.assertEqual(cached, content)
+
+    def test_invalid_requests_not_found(self):
+        """Неверная подпись, размер больше исходной картинки или предела,
+        неизвестный формат дают 404.
+        """
+        valid = image_url(self.post, '20x10.jpg')
+        urls = (
+            valid.replace('/20x10.jpg', '/21x10.jpg'),
+            image_url(self.post, '80x40.jpg'),
+            image_url(self.post, '99999x10.jpg'),
+            image_url(self.post, '20x10.bmp'),
+            reverse('posts:post_image', args=(self.posts.pk, 'x', '1x1.jpg')),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.fetch(url)[0].status_code, 404)
+
+    def test_decompression_bomb_not_found(self):
+        """Картинка, которую Pillow считает бомбой декомпрессии,
+        даёт 404, а не ошибку сервера.
+        """
+        pixels = self.post.image_width * self.post.image_height
+        with mock.patch('PIL.Image.MAX_IMAGE_PIXELS', pixels // 4):
+            response, _ = self.fetch(image_url(self.post, '20x10.jpg'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(IMAGE_RESIZE_TIMEOUT=0)
+    def test_busy_resizer_answers_503(self):
+        """Когда все места для создания вариантов заняты, сервер просит
+        повторить запрос позже.
+        """
+        with mock.patch('posts.resize._slots', threading.Semaphore(0)):
+            response, _ = self.fetch(image_url(self.post, '20x10.jpg'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
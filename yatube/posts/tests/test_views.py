@@ -1,6 +1,8 @@
 from django.core.cache import cache
+from django.core.paginator import EmptyPage
 
-from posts.models import Follow, Post
+from posts.models import Comment, Follow, Post
+from yatube.settings import AMOUNT_OF_COMMENTS
 from .test_config import (AMOUNT, AMOUNT_OF_POSTS, BaseTestCase, INDEX_REVERSE,
                           FOLLOW_REVERSE)
 
@@ -36,11 +38,94 @@ class PostPagesTest(BaseTestCase):
         for route, amount in routes_amounts.items():
             with self.subTest(route=route):
                 response = self.authors_client.get(route)
-                last_page = response.context['page_obj'].end_index()
+                next_cursor = response.context['page_obj'].next_cursor
                 response = self.authors_client.get(
-                    route + f'?page={last_page}')
+                    route + f'?page={next_cursor}')
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj.object_list), amount)
+                self.assertIsNone(page_obj.next_cursor)
+
+    def test_previous_cursor_returns_to_first_page(self):
+        """Курсор назад со второй страницы возвращает первую страницу."""
+        first_page = self.authors_client.get(INDEX_REVERSE).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.authors_client.get(
+            INDEX_REVERSE + f'?page={first_page.next_cursor}'
+        ).context['page_obj']
+        page_obj = self.authors_client.get(
+            INDEX_REVERSE + f'?page={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(page_obj), list(first_page))
+        self.assertIsNone(page_obj.previous_cursor)
+        self.assertIsNotNone(page_obj.next_cursor)
+
+    def test_last_cursor_returns_oldest_posts(self):
+        """Курсор последней страницы отдаёт самые старые посты."""
+        paginator = self.authors_client.get(
+            INDEX_REVERSE).context['page_obj'].paginator
+        page_obj = self.authors_client.get(
+            INDEX_REVERSE + f'?page={paginator.last_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            list(page_obj),
+            list(Post.objects.order_by('-pub_date', '-pk')[AMOUNT:])
+        )
+        self.assertIsNone(page_obj.next_cursor)
+        self.assertIsNotNone(page_obj.previous_cursor)
+
+    def test_page_supports_standard_page_api(self):
+        """Методы Page работают на курсорах: соседняя страница — её курсор,
+        который принимает параметр page, а номер страницы целый.
+        """
+        first_page = self.authors_client.get(INDEX_REVERSE).context['page_obj']
+        self.assertEqual(first_page.number, 1)
+        self.assertEqual(first_page.cursor, '')
+        self.assertEqual(first_page.start_index(), 1)
+        self.assertEqual(first_page.end_index(), AMOUNT_OF_POSTS)
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_other_pages())
+        with self.assertRaises(EmptyPage):
+            first_page.previous_page_number()
+        last_page = self.authors_client.get(
+            INDEX_REVERSE + f'?page={first_page.next_page_number()}'
+        ).context['page_obj']
+        self.assertEqual(last_page.number, 2)
+        self.assertEqual(last_page.cursor, first_page.next_cursor)
+        self.assertEqual(last_page.start_index(), AMOUNT_OF_POSTS + 1)
+        self.assertEqual(last_page.end_index(), Post.objects.count())
+        self.assertFalse(last_page.has_next())
+        self.assertTrue(last_page.has_previous())
+        with self.assertRaises(EmptyPage):
+            last_page.next_page_number()
+        self.assertEqual(last_page.previous_page_number(),
+                         last_page.previous_cursor)
+
+    def test_pages_from_the_end_are_numbered(self):
+        """Страницы, открытые с конца ленты, получают обычные номера."""
+        paginator = self.authors_client.get(
+            INDEX_REVERSE).context['page_obj'].paginator
+        last_page = self.authors_client.get(
+            INDEX_REVERSE + f'?page={paginator.last_cursor}'
+        ).context['page_obj']
+        self.assertEqual(last_page.number, 2)
+        self.assertEqual(last_page.start_index(), AMOUNT_OF_POSTS + 1)
+        previous_page = self.authors_client.get(
+            INDEX_REVERSE + f'?page={last_page.previous_page_number()}'
+        ).context['page_obj']
+        self.assertEqual(previous_page.number, 1)
+        self.assertEqual(previous_page.start_index(), 1)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор не ломает страницу, а отдаёт первую."""
+        for cursor in ('10', 'not-a-cursor', 'WzFd'):
+            with self.subTest(cursor=cursor):
+                response = self.authors_client.get(
+                    INDEX_REVERSE + f'?page={cursor}')
                 self.assertEqual(
-                    len(response.context['page_obj'].object_list), amount)
+                    len(response.context['page_obj']), AMOUNT_OF_POSTS)
+                self.assertIsNone(
+                    response.context['page_obj'].previous_cursor)
 
     def test_post_from_all_routes_show_correct_context(self):
         """Проверка контекста поста для страниц со списком постов"""
@@ -95,15 +180,36 @@ class PostPagesTest(BaseTestCase):
                     response.context['page_obj'].paginator.object_list)
 
     def test_cache_works_correctly(self):
-        response = self.authors_client.get(INDEX_REVERSE)
-        content_before = response.content
-        Post.objects.get(id=self.posts.pk).delete()
+        """Лента главной страницы кэшируется до изменения постов."""
+        content_before = self.authors_client.get(INDEX_REVERSE).content
+        Post.objects.filter(pk=self.posts.pk).update(text='Not signalled')
         self.assertEqual(content_before,
                          self.authors_client.get(INDEX_REVERSE).content)
-        cache.clear()
-        response_after_clear = self.authors_client.get(INDEX_REVERSE)
-        content_after = response_after_clear.content
+        Post.objects.get(id=self.posts.pk).delete()
+        content_after = self.authors_client.get(INDEX_REVERSE).content
         self.assertNotEqual(content_before, content_after)
+        self.assertNotIn(b'Not signalled', content_after)
+        cache.clear()
+        self.assertEqual(content_after,
+                         self.authors_client.get(INDEX_REVERSE).content)
+
+    def test_cache_is_page_aware(self):
+        """Кэш ленты хранит каждую страницу отдельно."""
+        first_page = self.authors_client.get(INDEX_REVERSE)
+        next_cursor = first_page.context['page_obj'].next_cursor
+        second_page = self.authors_client.get(
+            INDEX_REVERSE + f'?page={next_cursor}')
+        self.assertNotEqual(first_page.content, second_page.content)
+        self.assertContains(
+            second_page, second_page.context['page_obj'][0].text)
+
+    def test_author_rename_invalidates_cache(self):
+        """Смена имени автора сбрасывает кэш ленты."""
+        self.authors_client.get(INDEX_REVERSE)
+        self.author.first_name = 'Renamed'
+        self.author.save()
+        self.assertContains(self.authors_client.get(INDEX_REVERSE),
+                            'Renamed')
 
     def test_authorized_user_can_follow_unfollow_authors(self):
         self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
@@ -115,3 +221,39 @@ class PostPagesTest(BaseTestCase):
         self.followers_client.get(self.PROFILE_FOLLOW_REVERSE)
         response = self.followers_client.get(FOLLOW_REVERSE)
         self.assertEqual(response.context['page_obj'][0].pk, self.posts.pk)
+
+
+class PostDetailTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Comment.objects.bulk_create(
+            Comment(post=cls.posts, author=cls.follower, text=f'Comment {i}')
+            for i in range(AMOUNT_OF_COMMENTS + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_query_count_does_not_grow(self):
+        """Пост, автор, группа и комментарии с авторами
+        выбираются двумя запросами; третий ищет автора для ключа кэша.
+        """
+        with self.assertNumQueries(3):
+            self.guest_client.get(self.POST_DETAIL_REVERSE)
+
+    def test_comments_are_paginated(self):
+        """Комментарии выводятся постранично в порядке написания."""
+        comments = list(self.posts.comments.order_by('created', 'pk'))
+        response = self.guest_client.get(self.POST_DETAIL_REVERSE)
+        first_page = response.context['comments']
+        self.assertEqual(list(first_page), comments[:AMOUNT_OF_COMMENTS])
+        response = self.guest_client.get(
+            self.POST_DETAIL_REVERSE + f'?page={first_page.next_cursor}')
+        self.assertEqual(list(response.context['comments']),
+                         comments[AMOUNT_OF_COMMENTS:])
+
+    def test_missing_post_returns_not_found(self):
+        """Несуществующий пост отдаёт 404."""
+        response = self.guest_client.get('/posts/100500/')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,22 @@
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+
+def render_html(text):
+    """Текст с экранированным HTML, разбитый на абзацы, как фильтр
+    linebreaks.
+    """
+    return linebreaks(text, autoescape=True)
+
+
+def make_excerpt(text, length):
+    """Начало текста в одну строку, обрезанное по границе слова."""
+    return Truncator(' '.join(text.split())).chars(length)
+
+
+def render_text(instance):
+    """Заполняет сохраняемые вместе с текстом HTML и отрывок."""
+    instance.text_html = render_html(instance.text)
+    if hasattr(instance, 'excerpt'):
+        instance.excerpt = make_excerpt(instance.text,
+                                        instance.EXCERPT_LENGTH)
@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as DBKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache import lookup
+from .storage import content_digest
+
+logger = logging.getLogger(__name__)
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+FALLBACK_FORMAT = 'JPEG'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _file_digest(source):
+    try:
+        digest = hashlib.sha256()
+        with source.storage.open(source.name) as image:
+            for chunk in iter(lambda: image.read(DIGEST_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class HashedThumbnailBackend(ThumbnailBackend):
+    """Имя миниатюры зависит от содержимого исходной картинки, а не от
+    её пути, поэтому файлы миниатюр можно отдавать с вечным кэшем.
+    Хеш исходника берётся из имени файла в ContentAddressedStorage,
+    а для остальных файлов считается один раз и хранится в кэше.
+    """
+
+    def source_digest(self, source):
+        return (
+            content_digest(source.name)
+            or lookup('image-digest', source.name,
+                      lambda name: _file_digest(source))
+            or source.key
+        )
+
+    def thumbnail_name(self, file_, geometry_string, **options):
+        """Имя миниатюры без обращения к KV-хранилищу; опции дополняются
+        так же, как в get_thumbnail.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(self.source_digest(source), geometry_string,
+                    serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        return (f'{sorl_settings.THUMBNAIL_PREFIX}{path}.'
+                f'{EXTENSIONS[options["format"]]}')
+
+
+class TieredKVStore(DBKVStore):
+    """KV-хранилище sorl поверх общего кэша и базы данных. Метаданные
+    страницы можно загрузить заранее одним обращением к кэшу через
+    prefetch. Отдельного уровня в памяти здесь нет: его роль играет
+    первый уровень TwoTierCache, который выселяет ключи, изменённые
+    другими процессами.
+    """
+
+    def prefetch(self, keys):
+        """Загружает значения ключей в кэш: одно обращение к кэшу и не
+        больше одного запроса к базе за промахи.
+        """
+        found = self.cache.get_many(keys)
+        rest = [key for key in keys if key not in found]
+        if rest:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=rest
+            ).values_list('key', 'value'))
+            self.cache.set_many(
+                {key: stored.get(key, EMPTY_VALUE) for key in rest},
+                sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+
+
+@lru_cache(maxsize=None)
+def get_formats():
+    """Форматы вариантов, которые умеет сохранять установленный Pillow;
+    последний формат — запасной для браузеров без поддержки остальных.
+    """
+    Image.init()
+    formats = [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+    if FALLBACK_FORMAT not in formats:
+        formats.append(FALLBACK_FORMAT)
+    return tuple(formats)
+
+
+def get_base_size():
+    """Ширина и высота основной миниатюры поста."""
+    width, height = settings.POST_THUMBNAIL_GEOMETRY.split('x')
+    return int(width), int(height)
+
+
+def variant_height(width):
+    base_width, base_height = get_base_size()
+    return round(width * base_height / base_width)
+
+
+def get_geometries(size=None):
+    """Геометрии вариантов с теми же пропорциями, что и миниатюра поста.
+
+    size — сохранённые размеры исходной картинки: варианты больше неё
+    пришлось бы растягивать, поэтому из них остаётся только наименьший.
+    """
+    geometries = [(width, f'{width}x{variant_height(width)}')
+                  for width in settings.POST_IMAGE_WIDTHS]
+    if size is None or None in size:
+        return tuple(geometries)
+    source_width, source_height = size
+    return tuple([
+        (width, geometry) for width, geometry in geometries
+        if width <= source_width and variant_height(width) <= source_height
+    ] or geometries[:1])
+
+
+def image_size(post):
+    return post.image_width, post.image_height
+
+
+def get_variants(image, size=None):
+    """Варианты картинки: {формат: [(миниатюра, ширина), ...]}."""
+    return {
+        image_format: [
+            (get_thumbnail(image, geometry, format=image_format,
+                           **settings.POST_THUMBNAIL_OPTIONS), width)
+            for width, geometry in get_geometries(size)
+        ]
+        for image_format in get_formats()
+    }
+
+
+def prefetch_variants(posts):
+    """Заранее загружает метаданные вариантов картинок постов страницы."""
+    if not hasattr(default.kvstore, 'prefetch'):
+        return
+    keys = [
+        add_prefix(ImageFile(
+            default.backend.thumbnail_name(
+                post.image, geometry, format=image_format,
+                **settings.POST_THUMBNAIL_OPTIONS
+            ),
+            default.storage
+        ).key)
+        for post in posts if post.image
+        for image_format in get_formats()
+        for _, geometry in get_geometries(image_size(post))
+    ]
+    default.kvstore.prefetch(keys)
+
+
+def generate(name, size=None):
+    """Создаёт варианты картинки поста и записывает их в KV-хранилище
+    sorl.
+    """
+    try:
+        get_variants(name, size)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+        return False
+    return True
+
+
+def _generate_in_worker(name, size=None):
+    try:
+        return generate(name, size)
+    finally:
+        # У каждого потока своё соединение с базой: закрываем его сами,
+        # обработчики запроса до потоков пула не доходят.
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            # Пока ждали блокировку, пул мог создать другой поток.
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.THUMBNAIL_WORKERS,
+                    thread_name_prefix='thumbnails'
+                )
+    return _executor
+
+
+def schedule(name, size=None):
+    """Ставит создание миниатюры в очередь пула потоков."""
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name, size)
+        return
+    get_executor().submit(_generate_in_worker, name, size)
+
+
+def schedule_changed(form, post):
+    """Ставит в очередь миниатюру, если форма сохранила новую картинку."""
+    if 'image' in form.changed_data and post.image:
+        schedule(post.image.name, image_size(post))
+    return post
+
+
+def generate_many(images, workers):
+    """Создаёт миниатюры параллельно и возвращает число неудач.
+    images — пары (имя файла, размеры исходной картинки).
+    """
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix='thumbnails') as executor:
+        return sum(
+            not done for done in executor.map(
+                lambda image: _generate_in_worker(*image), images
+            )
+        )
@@ -0,0 +1,114 @@
+import base64
+import os
+import tempfile
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageFilter, ImageOps
+
+from .thumbnails import get_base_size
+
+# Форматы, в которых мастер-копия сохраняется как есть; остальные
+# перекодируются в PNG.
+MASTER_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+FALLBACK_MASTER_FORMAT = 'PNG'
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+PLACEHOLDER_WIDTH = 24
+PLACEHOLDER_QUALITY = 40
+COLOR_SAMPLE_SIZE = (64, 64)
+PALETTE_SIZE = 4
+EMPTY_DESCRIPTION = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_placeholder': '',
+}
+
+
+def check_limits(uploaded):
+    """Проверяет размер файла и число пикселей до декодирования."""
+    if uploaded.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+            code='file_too_large'
+        )
+    uploaded.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            # Image.open читает только заголовок: пиксели не декодируются.
+            image = Image.open(uploaded)
+        except (Image.DecompressionBombError,
+                Image.DecompressionBombWarning):
+            image = None
+    if image is None or (image.width * image.height
+                         > settings.POST_IMAGE_MAX_PIXELS):
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            code='too_many_pixels'
+        )
+    return image
+
+
+def describe(image):
+    """Поля поста, описывающие картинку: размеры, основной цвет
+    и крошечная размытая заглушка в пропорциях миниатюры.
+    """
+    rgb = image.convert('RGB')
+    sample = rgb.copy()
+    sample.thumbnail(COLOR_SAMPLE_SIZE)
+    palette = sample.quantize(colors=PALETTE_SIZE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+
+    width, height = get_base_size()
+    placeholder = ImageOps.fit(
+        rgb, (PLACEHOLDER_WIDTH, max(1, PLACEHOLDER_WIDTH * height // width))
+    ).filter(ImageFilter.GaussianBlur(1))
+    content = BytesIO()
+    placeholder.save(content, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    return {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_placeholder': 'data:image/jpeg;base64,'
+                             + base64.b64encode(content.getvalue()).decode(),
+    }
+
+
+def make_master(uploaded):
+    """Возвращает мастер-копию картинки (без EXIF, повёрнутую по тегу
+    ориентации и уменьшенную до POST_IMAGE_MAX_SIDE по большей стороне)
+    и её описание из describe.
+
+    Файл пишется во временный файл на диске под тем же именем, поэтому
+    в памяти держится только декодированная картинка ограниченного
+    размера. У анимаций сохраняется только первый кадр.
+    """
+    image = check_limits(uploaded)
+    name = uploaded.name
+    image_format = image.format
+    if image_format not in MASTER_FORMATS:
+        image_format = FALLBACK_MASTER_FORMAT
+        name = f'{os.path.splitext(name)[0]}.png'
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    # Часть плагинов Pillow берёт метаданные из image.info при сохранении.
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+
+    master = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    image.save(master, image_format,
+               **settings.POST_IMAGE_SAVE_OPTIONS.get(image_format, {}))
+    master.seek(0)
+    return File(master, name=name), describe(image)
@@ -9,6 +9,13 @@ urlpatterns = (
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.search, name='search'),
+    path('suggest/', views.suggest, name='suggest'),
+    path(
+        'posts/<int:post_id>/image/<str:signature>/<str:spec>',
+        views.post_image,
+        name='post_image'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
@@ -1,9 +1,201 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
 
-from yatube.settings import AMOUNT_OF_POSTS
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
+from yatube.settings import AMOUNT_OF_COMMENTS
+from .models import Post
 
-def get_page_obj(request, queryset, argument, amount_of_posts=AMOUNT_OF_POSTS):
-    paginator = Paginator(queryset, amount_of_posts)
-    page_number = request.GET.get(argument)
-    return paginator.get_page(page_number)
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+class KeysetPage(Page):
+    """Страница KeysetPaginator. Соседние страницы известны по курсорам,
+    а не по числу страниц: next_page_number() и previous_page_number()
+    возвращают курсоры, которые принимает параметр page.
+
+    Номер страницы переносится в курсоре. У страниц, отсчитанных от
+    последней, он отрицательный и переводится в обычный по общему числу
+    объектов, только когда его читают.
+    """
+
+    def __init__(self, object_list, number, paginator, cursor='',
+                 previous_cursor=None, next_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self.cursor = cursor
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage {self.relative_number}>'
+
+    @property
+    def number(self):
+        if self.relative_number > 0:
+            return self.relative_number
+        return max(1, self.paginator.num_pages + 1 + self.relative_number)
+
+    @number.setter
+    def number(self, value):
+        self.relative_number = value
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        if self.next_cursor is None:
+            raise EmptyPage('Это последняя страница')
+        return self.next_cursor
+
+    def previous_page_number(self):
+        if self.previous_cursor is None:
+            raise EmptyPage('Это первая страница')
+        return self.previous_cursor
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (дата, id) вместо OFFSET.
+
+    Страница выбирается поиском по индексу от позиции курсора, поэтому
+    глубокие страницы стоят столько же, сколько первая, а COUNT(*)
+    не выполняется вовсе. Общее число объектов, если оно нужно шаблону,
+    передаётся готовым из денормализованного счётчика.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True, count=None):
+        self.date_field = date_field
+        self.descending = descending
+        prefix = '-' if descending else ''
+        super().__init__(
+            object_list.order_by(prefix + date_field, prefix + 'pk'),
+            per_page
+        )
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        """Переданное готовым число объектов, иначе COUNT(*)."""
+        if self.known_count is not None:
+            return self.known_count
+        return super().count
+
+    @property
+    def last_cursor(self):
+        return self.encode_cursor(LAST)
+
+    def encode_cursor(self, direction, obj=None, number=None):
+        value = [direction]
+        if obj is not None:
+            value += [number, *self.dump_key(obj)]
+        raw = json.dumps(value, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Разбирает курсор в направление, номер страницы и позицию;
+        на любой мусор возвращает первую страницу.
+        """
+        first = None, 1, None
+        if not cursor:
+            return first
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            value = json.loads(raw.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return first
+        if value == [LAST]:
+            return LAST, -1, None
+        if (not isinstance(value, list) or len(value) != 4
+                or value[0] not in (NEXT, PREVIOUS)
+                or type(value[1]) is not int or value[1] == 0):
+            return first
+        position = self.load_key(value[2:])
+        if position is None:
+            return first
+        return value[0], value[1], position
+
+    def key(self, obj):
+        return getattr(obj, self.date_field), obj.pk
+
+    def dump_key(self, obj):
+        date, pk = self.key(obj)
+        return [date.isoformat(), pk]
+
+    def load_key(self, value):
+        """Позиция из курсора или None, если курсор испорчен."""
+        date, pk = value
+        if not isinstance(date, str) or not isinstance(pk, int):
+            return None
+        try:
+            date = parse_datetime(date)
+        except ValueError:
+            return None
+        return None if date is None else (date, pk)
+
+    def seek(self, queryset, position, backwards=False, pk_field='pk'):
+        # Условие записано как диапазон по дате плюс исключение, чтобы
+        # СУБД могла начать чтение индекса прямо с позиции курсора.
+        date, pk = position
+        field = self.date_field
+        if self.descending != backwards:
+            return queryset.filter(**{f'{field}__lte': date}).exclude(
+                **{field: date, f'{pk_field}__gte': pk}
+            )
+        return queryset.filter(**{f'{field}__gte': date}).exclude(
+            **{field: date, f'{pk_field}__lte': pk}
+        )
+
+    def fetch(self, position, backwards, limit):
+        """Возвращает до limit объектов за курсором в порядке обхода."""
+        queryset = self.object_list
+        if position is not None:
+            queryset = self.seek(queryset, position, backwards)
+        if backwards:
+            queryset = queryset.reverse()
+        return list(queryset[:limit])
+
+    def get_page(self, cursor):
+        direction, number, position = self.decode_cursor(cursor)
+        backwards = direction in (PREVIOUS, LAST)
+        rows = self.fetch(position, backwards, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        next_cursor = previous_cursor = None
+        # Если с начала ленты добавились объекты, перед первой по номеру
+        # страницей окажется ещё одна; номер 0 в курсоре не бывает.
+        if rows and (has_more if not backwards else direction == PREVIOUS):
+            next_cursor = self.encode_cursor(NEXT, rows[-1],
+                                             number + 1 or number)
+        if rows and (has_more if backwards else direction == NEXT):
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0],
+                                                 number - 1 or number)
+        return KeysetPage(rows, number, self,
+                          cursor if direction is not None else '',
+                          previous_cursor, next_cursor)
+
+
+def get_post_detail(request, post_id, argument,
+                    amount_of_comments=AMOUNT_OF_COMMENTS):
+    """Пост с автором, его счётчиками и группой одним запросом
+    и страница комментариев с авторами вторым.
+    """
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'), amount_of_comments,
+        date_field='created', descending=False,
+        count=post.comments_count
+    )
+    return post, paginator.get_page(request.GET.get(argument))
@@ -1,50 +1,82 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_safe
+from PIL import Image
+
+from yatube.settings import (AMOUNT_OF_POSTS, AUTOCOMPLETE_LIMIT,
+                             AUTOCOMPLETE_MAX_QUERY, FEED_CACHE_TIMEOUT,
+                             IMAGE_CACHE_MAX_AGE)
+from .autocomplete import autocomplete
+from .cache import (cache_anonymous, get_generation, group_dependencies,
+                    index_dependencies, page_etag, post_dependencies,
+                    profile_dependencies)
+from .counters import get_stats
+from .feed import FeedPaginator
 from .forms import CommentForm, PostForm
+from .lists import get_feed_page
 from .models import Follow, Group, Post
-from .utils import get_page_obj
+from .resize import (CONTENT_TYPES, ResizeBusy, check_signature,
+                     get_resized, parse_spec)
+from .search import SearchPaginator
+from .thumbnails import schedule_changed
+from .utils import get_post_detail
 
 User = get_user_model()
 
 
+@condition(etag_func=page_etag(index_dependencies))
+@cache_anonymous(index_dependencies)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     context = {
-        'page_obj': get_page_obj(request, post_list, 'page'),
+        'page_obj': get_feed_page(request, post_list, 'index'),
+        'feed_generation': get_generation('feed'),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=page_etag(group_dependencies))
+@cache_anonymous(group_dependencies)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('author', 'group')
     context = {
         'group': group,
-        'page_obj': get_page_obj(request, post_list, 'page'),
+        'page_obj': get_feed_page(request, post_list, f'group:{group.pk}',
+                                  count=group.posts_count),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=page_etag(profile_dependencies))
+@cache_anonymous(profile_dependencies)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author')
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.select_related('author', 'group')
     following = (request.user.is_authenticated
                  and author.following.filter(user=request.user).exists()
                  and not request.user.is_anonymous)
     context = {
         'author': author,
-        'page_obj': get_page_obj(request, post_list, 'page'),
+        'page_obj': get_feed_page(request, post_list, f'author:{author.pk}',
+                                  count=get_stats(author).posts_count),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=page_etag(post_dependencies))
+@cache_anonymous(post_dependencies)
 def post_detail(request, post_id):
-    post = Post.objects.get(pk=post_id)
+    post, comments = get_post_detail(request, post_id, 'page')
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('post')
     context = {
         'post': post,
         'form': form,
@@ -53,13 +85,68 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@require_safe
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(query, AMOUNT_OF_POSTS)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@require_safe
+def suggest(request):
+    query = request.GET.get('q', '')[:AUTOCOMPLETE_MAX_QUERY]
+    return JsonResponse(
+        {'results': autocomplete.search(query, AUTOCOMPLETE_LIMIT)}
+    )
+
+
+@require_safe
+def post_image(request, post_id, signature, spec):
+    size = parse_spec(spec)
+    if size is None:
+        raise Http404
+    post = get_object_or_404(
+        Post.objects.only('image', 'image_width', 'image_height'), pk=post_id
+    )
+    if not post.image or not check_signature(post.image.name, spec,
+                                             signature):
+        raise Http404
+    # Варианты крупнее исходной картинки не создаём: их пришлось бы
+    # растягивать.
+    if post.image_width and post.image_height and (
+            size[0] > post.image_width or size[1] > post.image_height):
+        raise Http404
+    try:
+        path = get_resized(post.image, spec, size)
+    except ResizeBusy:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = 1
+        return response
+    except (OSError, Image.DecompressionBombError):
+        # Битый файл или картинка, которую опасно декодировать.
+        raise Http404
+    response = FileResponse(open(path, 'rb'),
+                            content_type=CONTENT_TYPES[size[2]])
+    patch_cache_control(response, public=True, immutable=True,
+                        max_age=IMAGE_CACHE_MAX_AGE)
+    return response
+
+
 @login_required(login_url='users:login')
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     form.instance.author = request.user
     if not form.is_valid():
         return render(request, 'posts/post_create.html', {'form': form})
-    form.save()
+    schedule_changed(form, form.save())
     return redirect('posts:profile', username=request.user.username)
 
 
@@ -83,7 +170,7 @@ def post_edit(request, post_id):
         }
         return render(request, 'posts/post_create.html', context)
 
-    form.save()
+    schedule_changed(form, form.save())
     return redirect_to_post_detail
 
 
@@ -104,8 +191,8 @@ def add_comment(request, post_id):
 
 @login_required(login_url='users:login')
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': get_page_obj(request, post_list, 'page')}
+    paginator = FeedPaginator(request.user, AMOUNT_OF_POSTS)
+    context = {'page_obj': paginator.get_page(request.GET.get('page'))}
     return render(request, 'posts/follow.html', context)
 
 
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,10 +112,130 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Кэш общий для всех процессов сервера: небольшой LRU в памяти процесса
+# поверх файла SQLite. Посты, авторы и списки id лент кэшируются
+# поштучно, поэтому записей много.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 200_000, 'LOCAL_MAX_ENTRIES': 20_000},
     }
 }
+# Тесты работают с временным файлом кэша, а не с кэшем сервера.
+TEST_RUNNER = 'core.testing.TestRunner'
 
 AMOUNT_OF_POSTS = 10
+AMOUNT_OF_COMMENTS = 20
+
+# Когда подписчиков у автора становится больше FEED_FANOUT_LIMIT, его посты
+# перестают раскладываться по лентам подписчиков и подмешиваются в ленту
+# при чтении. Обратно к раскладке автор возвращается, только когда
+# подписчиков остаётся не больше FEED_PUSH_LIMIT: подписки и отписки
+# около одного порога не заполняют ленты заново каждый раз.
+FEED_FANOUT_LIMIT = 1000
+FEED_PUSH_LIMIT = 800
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 200
+FEED_BATCH_SIZE = 500
+
+COUNTERS_BATCH_SIZE = 1000
+
+# Совпадение в комментарии ранжируется в SEARCH_COMMENT_WEIGHT раз ниже
+# совпадения в тексте поста; лишние слова запроса отбрасываются.
+SEARCH_COMMENT_WEIGHT = 0.5
+SEARCH_MAX_TERMS = 10
+
+# Подсказки по началу имени автора и названия группы.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_QUERY = 100
+# Изменения индекса подсказок передаются другим процессам через кэш и
+# хранятся AUTOCOMPLETE_CHANGE_TIMEOUT секунд; процесс, отставший больше
+# чем на AUTOCOMPLETE_MAX_CHANGES изменений, перестраивает индекс из базы.
+AUTOCOMPLETE_CHANGE_TIMEOUT = 60 * 60
+AUTOCOMPLETE_MAX_CHANGES = 1000
+
+# Кэш ленты и страниц для анонимов сбрасывается сменой поколения при
+# изменении постов, групп и авторов, поэтому записи могут жить долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+ANONYMOUS_CACHE_TIMEOUT = 60 * 60 * 6
+# Истёкшую или устаревшую запись ленты и страницы поста пересчитывает
+# один процесс; остальные отдают прежнее значение, а если его нет, ждут
+# до STAMPEDE_WAIT секунд. Прежнее значение хранится ещё
+# STAMPEDE_STALE_TIMEOUT секунд после срока. Незадолго до срока запись
+# пересчитывается заранее с вероятностью, которую задаёт STAMPEDE_BETA.
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_WAIT = 5
+STAMPEDE_POLL_INTERVAL = 0.05
+STAMPEDE_STALE_TIMEOUT = 60 * 10
+STAMPEDE_BETA = 1.0
+# Начало каждой ленты хранится списком id постов на FEED_ID_PAGES
+# страниц; новые посты дописываются в списки на месте.
+FEED_ID_PAGES = 5
+FEED_IDS_TIMEOUT = 60 * 60
+OBJECT_CACHE_TIMEOUT = 60 * 60 * 6
+# Карточка поста хранится под ключом из поколений поста, автора и группы,
+# поэтому правка сбрасывает только затронутые карточки.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько SQL-запросов может выполнить представление, включая загрузку
+# сессии и пользователя. При QUERY_BUDGET_ENFORCE превышение бюджета
+# вызывает исключение, иначе попадает в лог.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_posts': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:post_create': 12,
+    'posts:post_edit': 12,
+    'posts:add_comment': 6,
+    'posts:follow_index': 5,
+    'posts:profile_follow': 12,
+    'posts:profile_unfollow': 10,
+    'posts:post_image': 2,
+    'posts:search': 4,
+    'posts:suggest': 2,
+}
+QUERY_BUDGET_ENFORCE = False
+QUERY_BUDGET_IGNORED_TABLES = ('thumbnail_kvstore',)
+
+# Основная миниатюра поста: задаёт пропорции адаптивных вариантов ниже.
+# Варианты создаются пулом потоков сразу после сохранения картинки;
+# при THUMBNAIL_WORKERS = 0 — в том же потоке.
+POST_THUMBNAIL_GEOMETRY = '960x399'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_WORKERS = 4
+
+# Ширины и форматы адаптивных вариантов картинки поста. Форматы, которые
+# не умеет сохранять установленный Pillow, пропускаются; JPEG остаётся
+# запасным.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+THUMBNAIL_BACKEND = 'posts.thumbnails.HashedThumbnailBackend'
+
+# Загрузки пишутся на диск по частям, а не собираются в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Ограничения на загружаемые картинки; проверяются до декодирования.
+POST_IMAGE_MAX_BYTES = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40_000_000
+# Мастер-копия уменьшается до этого размера по большей стороне.
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+}
+
+# Метаданные миниатюр хранятся в общем кэше и в базе.
+THUMBNAIL_KVSTORE = 'posts.thumbnails.TieredKVStore'
+
+# Варианты картинок по подписанным адресам создаются по запросу
+# и хранятся на диске; создаётся не больше IMAGE_RESIZE_CONCURRENCY
+# вариантов одновременно, остальные запросы ждут до IMAGE_RESIZE_TIMEOUT
+# секунд.
+IMAGE_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'resized')
+IMAGE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+IMAGE_RESIZE_CONCURRENCY = 2
+IMAGE_RESIZE_TIMEOUT = 10